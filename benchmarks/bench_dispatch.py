@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "simulation"))
+sys.path.insert(0, os.path.join(ROOT, "simulation", "web"))
+
+import simulation_grid_battery  # noqa: E402
+import simulation_grid_battery_vanilla as vanilla  # noqa: E402
+from bench_suite import Workload  # noqa: E402
+
+# Checks of the dispatch strategies: on example.csv the optimal schedule has to earn at
+# least as much as the heuristic and the rolling one in both simulators, and on the
+# suite's 1y hourly input the optimal strategy has to fit in --budget seconds. Exits
+# with 1 when a check fails.
+
+EXAMPLE_CSV = os.path.join(ROOT, "simulation", "web", "example.csv")
+STRATEGIES = ("heuristic", "optimal", "rolling")
+
+
+def net_profit(export_revenue, import_price):
+    return sum(export_revenue) - sum(import_price)
+
+
+def vanilla_profits(filename):
+    rows = vanilla.parse_csv(filename)
+    config = vanilla.resolve_step(vanilla.BatteryConfig(), rows)
+    profits = {}
+    for strategy in STRATEGIES:
+        result = vanilla.simulate(rows, config, strategy)
+        profits[strategy] = net_profit(
+            (row["grid_export_revenue"] for row in result), (row["grid_import_price"] for row in result)
+        )
+    return profits
+
+
+def pandas_profits(filename):
+    df = pd.read_csv(filename, parse_dates=["timestamp"])
+    profits = {}
+    for strategy in STRATEGIES:
+        result = simulation_grid_battery.simulate_energy_flow(df, strategy=strategy)
+        profits[strategy] = net_profit(result["grid_export_revenue"], result["grid_import_price"])
+    return profits
+
+
+def optimal_seconds(repeat):
+    # Best time of the vanilla optimal strategy on the suite's 1y hourly input
+    with tempfile.TemporaryDirectory() as directory:
+        workload = Workload("1y", "h", directory)
+        rows, config = workload.rows, workload.config
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            vanilla.simulate(rows, config, "optimal")
+            times.append(time.perf_counter() - start)
+    return len(rows), min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the optimal dispatch strategy's profit and speed")
+    parser.add_argument("--input", default=EXAMPLE_CSV, help="Simulator input for the profit check")
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds allowed for a 1y hourly optimal run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs (the best one is kept)")
+    args = parser.parse_args()
+
+    failed = False
+    for engine, profits in (("vanilla", vanilla_profits(args.input)), ("pandas", pandas_profits(args.input))):
+        print(f"{engine:8s} " + "  ".join(f"{strategy} {profit:10.2f}" for strategy, profit in profits.items()))
+        for strategy in ("heuristic", "rolling"):
+            # A hair of slack for solver round-off when both find the same schedule
+            if profits["optimal"] < profits[strategy] - 1e-6 * abs(profits[strategy]):
+                print(f"FAIL: {engine} optimal earns less than {strategy}")
+                failed = True
+
+    rows, seconds = optimal_seconds(args.repeat)
+    print(f"vanilla optimal, 1y hourly ({rows} rows): {seconds:.3f}s (budget {args.budget:.3f}s)")
+    if seconds > args.budget:
+        print("FAIL: optimal strategy over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "simulation"))
+
+import simulation_grid_battery  # noqa: E402
+
+EXAMPLE_CSV = os.path.join(ROOT, "simulation", "web", "example.csv")
+
+
+def load_scaled_example(years, freq="h"):
+    # Repeat the example year back to back and give it a continuous timestamp axis
+    df = pd.read_csv(EXAMPLE_CSV, parse_dates=["timestamp"])
+    steps_per_hour = int(pd.Timedelta("1h") / pd.tseries.frequencies.to_offset(freq))
+    scaled = pd.concat([df] * years, ignore_index=True)
+    if steps_per_hour > 1:
+        scaled = scaled.loc[scaled.index.repeat(steps_per_hour)].reset_index(drop=True)
+    scaled["timestamp"] = pd.date_range(df["timestamp"].iloc[0], periods=len(scaled), freq=freq)
+    return scaled
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the array engine with the iterrows reference")
+    parser.add_argument("--years", type=int, default=3, help="How many copies of example.csv to chain")
+    parser.add_argument("--freq", default="h", help="Timestep of the scaled input, e.g. h or 15min")
+    parser.add_argument("--skip-reference", action="store_true", help="Only time the array engine")
+    args = parser.parse_args()
+
+    df = load_scaled_example(args.years, args.freq)
+    print(f"Input: {len(df)} rows ({args.years} years, freq={args.freq})")
+
+    fast, fast_time = timed(simulation_grid_battery.simulate_energy_flow, df)
+    print(f"array engine: {fast_time:.3f}s")
+
+    if not args.skip_reference:
+        reference, reference_time = timed(simulation_grid_battery.simulate_energy_flow_iterrows, df)
+        print(f"iterrows reference: {reference_time:.3f}s")
+        print(f"speedup: {reference_time / fast_time:.1f}x")
+
+        pd.testing.assert_frame_equal(fast, reference, check_exact=True)
+        numeric = reference.select_dtypes(include=[np.number]).columns
+        identical = all(
+            np.array_equal(fast[c].to_numpy(), reference[c].to_numpy(), equal_nan=True) for c in numeric
+        )
+        print(f"bit-identical: {identical}")
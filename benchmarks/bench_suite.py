@@ -0,0 +1,293 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "simulation"))
+sys.path.insert(0, os.path.join(ROOT, "simulation", "web"))
+sys.path.insert(0, os.path.join(ROOT, "simulation", "data"))
+sys.path.insert(0, os.path.join(ROOT, "past_pv_price_calculator"))
+
+import batch_kernel  # noqa: E402
+import data_loader  # noqa: E402
+import result_store  # noqa: E402
+import simulation  # noqa: E402
+import simulation_grid_battery  # noqa: E402
+import simulation_grid_battery_vanilla as vanilla  # noqa: E402
+from load_profile import load_profiles  # noqa: E402
+
+# Benchmark suite for the simulators, the CSV readers/writers and the PV revenue
+# analytics on synthetic input. Every case is timed `--repeat` times (best run is
+# reported) and run once more under tracemalloc for its peak Python/NumPy allocation.
+# Results go to a JSON file; --compare prints the change against an earlier file.
+
+SIZES = {"1d": 1, "1y": 366, "10y": 3653}
+FREQS = ("h", "15min")
+
+# Row-by-row (iterrows) engines are skipped above this many rows unless --slow-rows says otherwise
+SLOW_ROWS = 10_000
+
+
+def synthetic_input(days, freq="h", seed=0):
+    # Simulator input with a plausible daily and seasonal shape, all energies in kWh per row:
+    # timestamp, price (EUR/MWh), solar_generation, wind_generation, consumption
+    step_hours = pd.tseries.frequencies.to_offset(freq).nanos / 3.6e12
+    index = pd.date_range("2024-01-01", periods=int(round(days * 24 / step_hours)), freq=freq)
+    rng = np.random.default_rng(seed)
+    hour = index.hour.to_numpy() + index.minute.to_numpy() / 60
+    summer = 0.5 - 0.5 * np.cos(2 * np.pi * (index.dayofyear.to_numpy() - 15) / 365)
+
+    daylight = np.clip(np.sin(np.pi * (hour - 5) / (14 + 4 * summer)), 0, None)
+    cloud = np.repeat(rng.uniform(0.2, 1.0, size=days + 1), int(round(24 / step_hours)))[:len(index)]
+    solar = 150 * daylight * (0.3 + 0.7 * summer) * cloud * step_hours
+    wind = np.clip(rng.gamma(2.0, 15.0, size=len(index)) - 10, 0, 100) * step_hours
+    price = 70 + 35 * np.sin(2 * np.pi * (hour - 12) / 24) + rng.normal(0, 15, size=len(index))
+    _, load = load_profiles(index[0], index[-1], freq=freq, seed=seed)
+    return pd.DataFrame({
+        "timestamp": index,
+        "price": price,
+        "solar_generation": solar,
+        "wind_generation": wind,
+        "consumption": load[0] * step_hours,
+    })
+
+
+class Workload:
+    # One input size and resolution: the synthetic frame, its CSV and the parsed and
+    # simulated forms the cases start from, each built on first use
+    def __init__(self, size, freq, directory):
+        self.size = size
+        self.freq = freq
+        self.directory = directory
+        self.df = synthetic_input(SIZES[size], freq)
+        self.csv = os.path.join(directory, f"input_{size}_{freq}.csv")
+        self.df.drop(columns="consumption").to_csv(self.csv, index=False, date_format="%Y-%m-%d %H:%M:%S")
+
+    @cached_property
+    def rows(self):
+        return vanilla.parse_csv(self.csv)
+
+    @cached_property
+    def config(self):
+        return vanilla.resolve_step(vanilla.BatteryConfig(), self.rows)
+
+    @cached_property
+    def result_rows(self):
+        return vanilla.simulate_energy_flow(self.rows, self.config)
+
+    @cached_property
+    def result_df(self):
+        return simulation_grid_battery.simulate_energy_flow(self.df.drop(columns="consumption"))
+
+    @cached_property
+    def days(self):
+        # (days, steps) price and generation for the batch kernel
+        steps = len(self.df) // SIZES[self.size]
+        price = self.df["price"].to_numpy()[:steps * SIZES[self.size]].reshape(-1, steps)
+        generation = (self.df["solar_generation"] + self.df["wind_generation"]).to_numpy()
+        return price, generation[:price.size].reshape(-1, steps)
+
+    @cached_property
+    def analytic_dir(self):
+        # data/ with a price file and a PVGIS export on the workload's time axis, as Analytic reads them
+        directory = os.path.join(self.directory, f"analytic_{self.size}_{self.freq}")
+        os.makedirs(os.path.join(directory, "data"), exist_ok=True)
+        ts = self.df["timestamp"].to_numpy().astype("datetime64[s]").astype(np.int64)
+        pd.DataFrame({
+            "timestamp": ts,
+            "datetime": self.df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S"),
+            "price_EUR_per_MWh": self.df["price"],
+        }).to_csv(os.path.join(directory, data_loader.priceFile), index=False)
+        hourly = ts[ts % 3600 == 0]
+        pd.DataFrame({
+            "timestamp": hourly,
+            "G(i)": self.df["solar_generation"].to_numpy()[ts % 3600 == 0] * 5,
+        }).to_csv(os.path.join(directory, data_loader.pvGISFile), index=False)
+        return directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+def _run_analytic(workload):
+    # Analytic reads data/ and writes result/ relative to the working directory
+    data_loader._read_price_series.cache_clear()
+    data_loader._read_pv_series.cache_clear()
+    cwd = os.getcwd()
+    os.chdir(workload.analytic_dir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            data_loader.Analytic(power=200)
+    finally:
+        os.chdir(cwd)
+
+
+def _run_batch(workload, configs=100):
+    price, generation = workload.days
+    grid = [
+        vanilla.BatteryConfig.from_settings(inverter, battery, 0.94, 0.95, step_hours=workload.config.step_hours)
+        for inverter in np.linspace(50, 300, 10) for battery in np.linspace(100, 1000, configs // 10)
+    ]
+    return batch_kernel.simulate_configs(price, generation, grid)
+
+
+# name -> (function of a Workload, row-by-row engine)
+CASES = {
+    "parse/pandas_read_csv": (lambda w: pd.read_csv(w.csv, parse_dates=["timestamp"]), False),
+    "parse/vanilla_read_columns": (lambda w: vanilla.read_columns(w.csv), False),
+    "parse/vanilla_parse_csv": (lambda w: vanilla.parse_csv(w.csv), False),
+    "parse/vanilla_iter_csv": (lambda w: list(vanilla.iter_csv(w.csv)), False),
+    "write/vanilla_csv": (lambda w: vanilla.write_csv(w.path("out.csv"), w.result_rows), False),
+    "write/vanilla_npy": (lambda w: vanilla.write_result(w.path("out.npy"), w.result_rows), False),
+    "write/pandas_csv": (lambda w: result_store.write_result(w.result_df, w.path("out_df.csv")), False),
+    "write/pandas_npy": (lambda w: result_store.write_result(w.result_df, w.path("out_df.npy")), False),
+    "simulate/simulation_py": (lambda w: simulation.simulate_energy_flow(w.df), True),
+    "simulate/grid_battery_heuristic": (lambda w: simulation_grid_battery.simulate_energy_flow(w.df), False),
+    "simulate/grid_battery_iterrows": (lambda w: simulation_grid_battery.simulate_energy_flow_iterrows(w.df), True),
+    "simulate/grid_battery_optimal": (
+        lambda w: simulation_grid_battery.simulate_energy_flow(w.df, strategy="optimal"), False
+    ),
+    "simulate/vanilla_heuristic": (lambda w: vanilla.simulate_energy_flow(w.rows, w.config), False),
+    "simulate/vanilla_optimal": (lambda w: vanilla.simulate(w.rows, w.config, "optimal"), False),
+    "simulate/vanilla_rolling": (lambda w: vanilla.simulate(w.rows, w.config, "rolling", 48), False),
+    "simulate/batch_kernel_100_configs": (_run_batch, False),
+    "analytic/merge_groupby": (_run_analytic, False),
+}
+
+
+def measure(func, workload, repeat):
+    # Best wall time of `repeat` runs, then one traced run for the peak allocation
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(workload)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func(workload)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, freqs, cases, repeat=3, slow_rows=SLOW_ROWS, log=print):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for freq in freqs:
+                workload = Workload(size, freq, directory)
+                rows = len(workload.df)
+                for name in cases:
+                    func, slow = CASES[name]
+                    if slow and rows > slow_rows:
+                        log(f"{name:40s} {size:>4s} {freq:>6s} skipped ({rows} rows > --slow-rows {slow_rows})")
+                        continue
+                    # Build the prepared inputs outside the measurement
+                    if name.startswith("write/vanilla"):
+                        workload.result_rows
+                    elif name.startswith("write/pandas"):
+                        workload.result_df
+                    elif name.startswith("simulate/vanilla"):
+                        workload.config
+                    seconds, peak = measure(func, workload, repeat)
+                    results.append({
+                        "case": name,
+                        "size": size,
+                        "freq": freq,
+                        "rows": rows,
+                        "seconds": seconds,
+                        "rows_per_second": rows / seconds if seconds > 0 else None,
+                        "peak_memory_mb": peak / 2 ** 20,
+                    })
+                    log(f"{name:40s} {size:>4s} {freq:>6s} {seconds:9.4f}s {peak / 2 ** 20:9.1f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance, min_seconds=0.01):
+    # Print the time ratio of every case also in the baseline; returns the regressions.
+    # Cases faster than min_seconds in both runs are too noisy to flag.
+    previous = {(r["case"], r["size"], r["freq"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} (ratio > {1 + tolerance:.2f} is a regression):")
+    for r in results:
+        old = previous.get((r["case"], r["size"], r["freq"]))
+        if old is None or old["seconds"] <= 0:
+            continue
+        ratio = r["seconds"] / old["seconds"]
+        slow_enough = max(r["seconds"], old["seconds"]) >= min_seconds
+        flag = " REGRESSION" if ratio > 1 + tolerance and slow_enough else ""
+        if flag:
+            regressions.append(r)
+        print(f"{r['case']:40s} {r['size']:>4s} {r['freq']:>6s} {old['seconds']:9.4f}s -> {r['seconds']:9.4f}s "
+              f"x{ratio:5.2f} mem {old['peak_memory_mb']:7.1f} -> {r['peak_memory_mb']:7.1f} MB{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the simulators, CSV I/O and PV analytics")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["1d", "1y"], help="Input lengths")
+    parser.add_argument("--freqs", nargs="+", choices=FREQS, default=list(FREQS), help="Input resolutions")
+    parser.add_argument("--cases", nargs="+", metavar="PREFIX",
+                        help="Only cases starting with one of these, e.g. simulate/vanilla parse")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (the best one is kept)")
+    parser.add_argument("--slow-rows", type=int, default=SLOW_ROWS,
+                        help="Skip the row-by-row reference engines above this many rows")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Slowdown share that counts as a regression in --compare")
+    parser.add_argument("--min-seconds", type=float, default=0.01,
+                        help="Do not flag cases faster than this in both runs")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(CASES))
+        sys.exit(0)
+    cases = [name for name in CASES if not args.cases or any(name.startswith(prefix) for prefix in args.cases)]
+    if not cases:
+        parser.error("No case matches --cases")
+
+    results = run_suite(args.sizes, args.freqs, cases, args.repeat, args.slow_rows)
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+        if regressions:
+            sys.exit(1)
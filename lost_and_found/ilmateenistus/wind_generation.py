@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+# Wind generation from Estonian Weather Service (ilmateenistus) observations, as array
+# operations over every year at once. Wind speeds measured at MEASUREMENT_HEIGHT are
+# scaled to hub height with the logarithmic wind profile, converted to power by linear
+# interpolation of the turbine's power curve and multiplied by the number of turbines.
+# The result is kept per year: yearly_profiles() is an hour-of-year x year table, and
+# profile_for() turns one year (or the mean of all years) into the simulators'
+# wind_generation column (kWh per row) for any timestamps and resolution.
+# Observations are stamped in UTC, simulator inputs in naive local time, so
+# read_observations() converts to TIMEZONE wall time first (like past_pv_price_calculator).
+
+MEASUREMENT_HEIGHT = 10  # m
+HUB_HEIGHT = 20  # m
+# Surface roughness length in m
+# https://wind-data.ch/tools/profile.php?h=10&v=1&z0=0.1&abfrage=Refresh
+ROUGHNESS = 0.1
+
+# Power curve of one turbine: hub-height wind speed (m/s) -> output (kW). Nothing below
+# the first point, rated power from the last point up to CUT_OUT_SPEED.
+CURVE_SPEEDS = np.array([3, 4, 5, 6, 7, 8, 9, 10, 11, 12], dtype=np.float64)
+CURVE_POWER = np.array([0, 0.267, 0.933, 1.7, 2.7, 3.867, 5.333, 7.2, 8.267, 8.6])
+CUT_OUT_SPEED = 25.0
+
+TIMEZONE = 'Europe/Tallinn'
+
+
+def read_observations(filename, timezone=TIMEZONE):
+    # Aasta;Kuu;Päev;Kell (UTC);wind_speed rows -> datetime (naive wall time in
+    # `timezone`), wind_speed (m/s). DST repeats one hour in autumn and skips one in spring,
+    # as the simulator inputs do.
+    df = pd.read_csv(filename, delimiter=';')
+    utc = (
+        pd.to_datetime(pd.DataFrame({'year': df['Aasta'], 'month': df['Kuu'], 'day': df['Päev']}))
+        + pd.to_timedelta(df['Kell (UTC)'] + ':00')
+    )
+    datetime = utc.dt.tz_localize('UTC').dt.tz_convert(timezone).dt.tz_localize(None)
+    return pd.DataFrame({'datetime': datetime, 'wind_speed': df['wind_speed']})
+
+
+def step_hours(timestamps):
+    # Row length in hours (1 for hourly observations, 0.25 for 15-minute data)
+    diff = pd.Series(timestamps).diff().median()
+    return 1.0 if pd.isna(diff) else diff / pd.Timedelta(hours=1)
+
+
+def shear_factor(hub_height=HUB_HEIGHT, measurement_height=MEASUREMENT_HEIGHT, roughness=ROUGHNESS):
+    # Logarithmic wind profile; the defaults give the 1.15 this script used to hard-code
+    return np.log(hub_height / roughness) / np.log(measurement_height / roughness)
+
+
+def power_output(speed, curve_speeds=CURVE_SPEEDS, curve_power=CURVE_POWER, cut_out=CUT_OUT_SPEED):
+    # kW of one turbine at hub-height `speed`; missing speeds stay NaN
+    speed = np.asarray(speed, dtype=np.float64)
+    power = np.interp(speed, curve_speeds, curve_power, left=0.0, right=curve_power[-1])
+    return np.where(speed >= cut_out, 0.0, power)
+
+
+def wind_generation(
+    observations,
+    hub_height=HUB_HEIGHT,
+    measurement_height=MEASUREMENT_HEIGHT,
+    roughness=ROUGHNESS,
+    turbines=1,
+    curve_speeds=CURVE_SPEEDS,
+    curve_power=CURVE_POWER,
+    cut_out=CUT_OUT_SPEED
+):
+    # Observations plus hub_speed, power_kW and energy_kWh (all turbines) per row
+    hub_speed = observations['wind_speed'].to_numpy(dtype=np.float64) * shear_factor(
+        hub_height, measurement_height, roughness
+    )
+    power = power_output(hub_speed, curve_speeds, curve_power, cut_out) * turbines
+    return observations.assign(
+        hub_speed=hub_speed,
+        power_kW=power,
+        energy_kWh=power * step_hours(observations['datetime']),
+    )
+
+
+def yearly_profiles(generation):
+    # Mean power (kW) per hour of the year: a (month, day, hour) x year table, NaN where
+    # a year has no observations (gaps, 29 February)
+    timestamps = generation['datetime'].dt
+    return generation.assign(
+        month=timestamps.month, day=timestamps.day, hour=timestamps.hour, year=timestamps.year
+    ).pivot_table(index=['month', 'day', 'hour'], columns='year', values='power_kW', aggfunc='mean')
+
+
+def yearly_totals(generation):
+    # Energy (kWh) and share of observed rows per year
+    grouped = generation.groupby(generation['datetime'].dt.year.rename('year'))
+    return pd.DataFrame({
+        'energy_kWh': grouped['energy_kWh'].sum(),
+        'coverage': grouped['wind_speed'].count() / grouped['wind_speed'].size(),
+    })
+
+
+def profile_for(timestamps, profiles, year=None):
+    # wind_generation (kWh per row) for `timestamps` from one year's profile, or from the
+    # mean of all years; hours the year lacks are filled from the mean
+    mean = profiles.mean(axis=1)
+    profile = mean if year is None else profiles[year].fillna(mean)
+    timestamps = pd.DatetimeIndex(timestamps)
+    key = pd.MultiIndex.from_arrays([timestamps.month, timestamps.day, timestamps.hour])
+    power = profile.reindex(key).fillna(0.0).to_numpy()
+    return power * step_hours(timestamps)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Wind generation from ilmateenistus wind speed observations')
+    parser.add_argument('input_file', nargs='?', default='input.csv', help='Semicolon-separated observations')
+    parser.add_argument('--hub-height', type=float, default=HUB_HEIGHT, help='Turbine hub height in m')
+    parser.add_argument('--measurement-height', type=float, default=MEASUREMENT_HEIGHT,
+                        help='Height of the wind speed measurements in m')
+    parser.add_argument('--roughness', type=float, default=ROUGHNESS, help='Surface roughness length in m')
+    parser.add_argument('--turbines', type=int, default=1, help='Number of turbines')
+    parser.add_argument('--timezone', default=TIMEZONE,
+                        help='Local time of the simulator inputs and of the output timestamps (UTC keeps UTC)')
+    parser.add_argument('--year', type=int, help='Use this year (default: every year, or their mean for --merge)')
+    parser.add_argument('--merge', metavar='SIMULATION_INPUT',
+                        help='Fill the wind_generation column of this simulator input from the --year profile')
+    parser.add_argument('--profiles', metavar='CSV', help='Also write the hour-of-year x year power table')
+    parser.add_argument('--output', default='wind_generation.csv',
+                        help='timestamp (--timezone wall time),wind_generation CSV (kWh per row), '
+                             'or the merged simulator input')
+    args = parser.parse_args()
+
+    generation = wind_generation(
+        read_observations(args.input_file, args.timezone),
+        hub_height=args.hub_height,
+        measurement_height=args.measurement_height,
+        roughness=args.roughness,
+        turbines=args.turbines,
+    )
+    totals = yearly_totals(generation)
+    for year, row in totals.iterrows():
+        print(f"{year}: {row['energy_kWh']:.2f} kWh ({row['coverage']:.0%} of hours observed)")
+
+    profiles = yearly_profiles(generation)
+    if args.profiles:
+        profiles.round(4).to_csv(args.profiles)
+        print(f"Hour-of-year profiles for {len(profiles.columns)} years saved to {args.profiles}")
+
+    if args.merge:
+        if args.year is not None and args.year not in profiles.columns:
+            parser.error(f'no observations for {args.year}')
+        merged = pd.read_csv(args.merge)
+        merged['wind_generation'] = profile_for(pd.to_datetime(merged['timestamp']), profiles, args.year)
+        merged.to_csv(args.output, index=False)
+        source = args.year if args.year is not None else 'the mean year'
+        print(f"wind_generation of {args.merge} filled from {source}, saved to {args.output}")
+    else:
+        if args.year is not None:
+            generation = generation[generation['datetime'].dt.year == args.year]
+        pd.DataFrame({
+            'timestamp': generation['datetime'],
+            'wind_generation': generation['energy_kWh'].fillna(0.0),
+        }).to_csv(args.output, index=False)
+        print(f"{len(generation)} rows of wind generation saved to {args.output}")
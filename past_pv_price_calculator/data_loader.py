@@ -2,26 +2,124 @@ import os
 import csv
 import requests
 import tempfile
-from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import datetime, timezone
 import argparse
+import numpy as np
 import pandas as pd
 from io import StringIO
 
+from timeseries_store import PVGIS_COLUMNS, TimeSeriesStore, location_key, year_of
+
 
 priceFile = "data/electricity_prices_ee.csv"
 pvGISFile = "data/pvgis.csv"
 
+# Series are kept as UTC epoch seconds; local time is only used for reporting periods
+REPORT_TZ = "Europe/Tallinn"
+
+# PVGIS series are hourly; prices may be hourly or 15-minute
+PV_STEP = 3600
+
+
+def asof_join(left_ts, right_ts, tolerance=0):
+    # Pair every left timestamp with the latest right timestamp at or before it, at most
+    # `tolerance` seconds earlier. Both are int64 UTC epoch arrays, right_ts sorted.
+    # Returns the matched (left positions, right positions).
+    pos = np.searchsorted(right_ts, left_ts, side="right") - 1
+    hit = pos >= 0
+    hit[hit] = left_ts[hit] - right_ts[pos[hit]] <= tolerance
+    left = np.flatnonzero(hit)
+    return left, pos[left]
+
+
+def step_hours(ts):
+    # Hours each row of a sorted UTC epoch series stands for: the gap to the next row,
+    # at most one hour (longer gaps are missing data); the last row repeats the one before
+    ts = np.asarray(ts, dtype=np.int64)
+    if len(ts) < 2:
+        return np.ones(len(ts))
+    gaps = np.diff(ts)
+    return np.minimum(np.r_[gaps, gaps[-1]], PV_STEP) / 3600
+
+
+def _sorted_series(ts, values):
+    order = np.argsort(ts, kind="stable")
+    ts, values = ts[order], values[order]
+    ts.flags.writeable = False
+    values.flags.writeable = False
+    return ts, values
+
+
+@lru_cache(maxsize=8)
+def _read_price_series(filename, mtime_ns):
+    df = pd.read_csv(filename, usecols=["timestamp", "price_EUR_per_MWh"])
+    return _sorted_series(df["timestamp"].to_numpy(dtype=np.int64), df["price_EUR_per_MWh"].to_numpy(dtype=np.float64))
+
+
+@lru_cache(maxsize=8)
+def _read_pv_series(filename, mtime_ns):
+    df = pd.read_csv(filename)
+    if "timestamp" in df.columns:
+        ts = df["timestamp"].to_numpy(dtype=np.int64)
+    else:
+        # Files written before the timestamp column existed only have local time strings
+        local = pd.to_datetime(df["time"]).dt.tz_localize(REPORT_TZ, ambiguous="infer", nonexistent="shift_forward")
+        ts = local.dt.tz_convert(None).to_numpy().astype("datetime64[s]").astype(np.int64)
+    return _sorted_series(ts, df["G(i)"].to_numpy(dtype=np.float64))
+
+
+def load_price_series(filename=priceFile):
+    # (UTC epoch seconds, EUR/MWh), sorted; cached until the file changes
+    return _read_price_series(filename, os.stat(filename).st_mtime_ns)
+
+
+def load_pv_series(filename=pvGISFile):
+    # (UTC epoch seconds, Wh per kW), sorted; cached until the file changes
+    return _read_pv_series(filename, os.stat(filename).st_mtime_ns)
+
+
+def local_time(ts):
+    # Naive Europe/Tallinn wall time of UTC epoch seconds, for grouping into reporting periods
+    return pd.DatetimeIndex(pd.to_datetime(np.asarray(ts), unit="s", utc=True)).tz_convert(REPORT_TZ).tz_localize(None)
+
+def make_session(pool_size=8, retries=4, backoff=0.5):
+    # One keep-alive connection pool shared by all fetches, retrying transient failures
+    # with exponential backoff (0.5s, 1s, 2s, ...)
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 class PVGISData:
-    def __init__(self, lat, lon, output_dir="data"):
+    BASE_URL = "https://re.jrc.ec.europa.eu/api/v5_3/seriescalc"
+    START_YEAR = 2013
+    END_YEAR = 2023
+
+    def __init__(self, lat, lon, output_dir="data", store=None, base_url=None, session=None):
         self.lat = lat
         self.lon = lon
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
         self.filename = pvGISFile
+        self.store = store if store is not None else TimeSeriesStore()
+        self.location = location_key(lat, lon)
+        self.base_url = base_url or self.BASE_URL
+        self.session = session or make_session()
 
-    def fetch(self):
-        print(f"Fetching PVGIS data for lat={self.lat}, lon={self.lon}...")
-        base_url = "https://re.jrc.ec.europa.eu/api/v5_3/seriescalc"
+    def fetch_years(self, start_year, end_year):
+        print(f"Fetching PVGIS data for lat={self.lat}, lon={self.lon}, {start_year}-{end_year}...")
         params = {
             "lat": self.lat,
             "lon": self.lon,
@@ -32,22 +130,22 @@ class PVGISData:
             "usehorizon": "1",
             "angle": "45",
             "aspect": "0",
-            "startyear": "2013",
-            "endyear": "2023",
+            "startyear": str(start_year),
+            "endyear": str(end_year),
             "mountingplace": "",
             "optimalinclination": "0",
             "optimalangles": "0",
             "js": "1",
             "select_database_hourly": "PVGIS-SARAH3",
-            "hstartyear": "2013",
-            "hendyear": "2023",
+            "hstartyear": str(start_year),
+            "hendyear": str(end_year),
             "trackingtype": "0",
             "hourlyangle": "45",
             "hourlyaspect": "0"
         }
 
         # Make the request
-        response = requests.get(base_url, params=params)
+        response = self.session.get(self.base_url, params=params)
         response.raise_for_status()  # Raise an error for bad status
 
         # Step 1: Get the lines and clean out metadata
@@ -64,75 +162,171 @@ class PVGISData:
         df[first_col] = pd.to_datetime(df[first_col], format="%Y%m%d:%H%M", errors="raise", utc=True)
 
         # Step 4: Round to the next full hour
-        df[first_col] = df[first_col].dt.floor("H")
+        df[first_col] = df[first_col].dt.floor("h")
 
-        # Step 5: Convert to Europe/Tallinn timezone
-        df[first_col] = df[first_col].dt.tz_convert("Europe/Tallinn")
+        # Step 5: Keep UTC epoch seconds and the known columns under their store names
+        epoch = df[first_col].dt.tz_convert(None).to_numpy().astype("datetime64[s]").astype("int64")
+        rows = pd.DataFrame({"ts": epoch})
+        for column, store_column in PVGIS_COLUMNS.items():
+            if column in df.columns:
+                rows[store_column] = df[column]
+        return rows.to_dict("records")
 
-        # Step 6: Format nicely
-        df[first_col] = df[first_col].dt.strftime("%Y-%m-%d %H:%M:%S")
+    def fetch(self):
+        # Full download, replacing whatever the store holds for this location
+        rows = self.fetch_years(self.START_YEAR, self.END_YEAR)
+        self.store.clear_pvgis(self.location)
+        self.store.save_pvgis(self.location, rows)
+        self.export()
+
+    def refresh(self, export=True):
+        # Download only the years after the last stored one
+        last_ts = self.store.last_timestamp("pvgis", self.location)
+        start_year = self.START_YEAR if last_ts is None else year_of(last_ts) + 1
+        if start_year <= self.END_YEAR:
+            self.store.save_pvgis(self.location, self.fetch_years(start_year, self.END_YEAR))
+        else:
+            print(f"PVGIS data for {self.location} is up to date")
+        if export:
+            self.export()
+
+    def load(self):
+        # Stored series as a DataFrame with a "ts" column and the store column names
+        columns = ["ts"] + list(PVGIS_COLUMNS.values())
+        return pd.DataFrame(self.store.pvgis(self.location), columns=columns)
 
+    def export(self):
+        df = self.load()
+
+        # Convert to Europe/Tallinn timezone and format nicely
+        time = pd.to_datetime(df["ts"], unit="s", utc=True).dt.tz_convert("Europe/Tallinn")
+        out = pd.DataFrame({"time": time.dt.strftime("%Y-%m-%d %H:%M:%S"), "timestamp": df["ts"]})
+        for column, store_column in PVGIS_COLUMNS.items():
+            if df[store_column].notna().any():
+                out[column] = df[store_column]
 
         # Salvestame CSV-faili
-        df.to_csv(self.filename, index=False)
+        out.to_csv(self.filename, index=False)
 
-    def load_or_fetch(self, reload=False):
-        if reload or not os.path.exists(self.filename):
+    def load_or_fetch(self, reload=False, refresh=False):
+        if reload:
             self.fetch()
+        elif refresh or not os.path.exists(self.filename):
+            self.refresh()
         else:
             print(f"Using cached PVGIS data from {self.filename}")
 
 
 class ElectricityPriceData:
-    def __init__(self, output_file=priceFile):
+    BASE_URL = "https://dashboard.elering.ee/api/nps/price"
+    START_YEAR = 2013
+    AREA = "ee"
+
+    def __init__(self, output_file=priceFile, store=None, base_url=None, session=None, max_workers=4):
         self.output_file = output_file
         os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
-
-    def fetch_year(self, year):
-        start = f"{year}-01-01T00:00:00.000Z"
-        end = f"{year}-12-31T23:59:59.999Z"
-        url = f"https://dashboard.elering.ee/api/nps/price?start={start}&end={end}"
-        print(f"Fetching electricity prices for {year}...")
-
-        response = requests.get(url)
+        self.store = store if store is not None else TimeSeriesStore()
+        self.base_url = base_url or self.BASE_URL
+        self.session = session or make_session()
+        self.max_workers = max_workers
+
+    def fetch_range(self, start, end):
+        # start/end are timezone-aware UTC datetimes
+        start = start.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        end = end.strftime("%Y-%m-%dT%H:%M:%S.999Z")
+        url = f"{self.base_url}?start={start}&end={end}"
+        print(f"Fetching electricity prices {start} - {end}...")
+
+        response = self.session.get(url)
         response.raise_for_status()
         data = response.json()
-        return data.get("data", {}).get("ee", [])
+        return data.get("data", {}).get(self.AREA, [])
 
-    def fetch_all(self):
-        current_year = datetime.utcnow().year
+    def fetch_year(self, year):
+        return self.fetch_range(
+            datetime(year, 1, 1, tzinfo=timezone.utc),
+            datetime(year, 12, 31, 23, 59, 59, tzinfo=timezone.utc),
+        )
+
+    def fetch_since(self, start):
+        # Fetch from start to now, one request per calendar year, max_workers at a time
+        now = datetime.now(timezone.utc)
+        ranges = [
+            (max(start, datetime(year, 1, 1, tzinfo=timezone.utc)),
+             datetime(year, 12, 31, 23, 59, 59, tzinfo=timezone.utc))
+            for year in range(start.year, now.year + 1)
+        ]
         all_data = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for year_data in pool.map(lambda r: self.fetch_range(*r), ranges):
+                all_data.extend(year_data)
+        return all_data
 
-        for year in range(2013, current_year + 1):
-            year_data = self.fetch_year(year)
-            all_data.extend(year_data)
+    def fetch_all(self):
+        all_data = self.fetch_since(datetime(self.START_YEAR, 1, 1, tzinfo=timezone.utc))
+        self.store.clear_prices(self.AREA)
+        self.store.save_prices(self.AREA, [(entry["timestamp"], entry["price"]) for entry in all_data])
+        self.export()
+
+    def import_csv(self):
+        # Seed an empty store from a previously downloaded price file
+        with open(self.output_file, newline="", encoding="utf-8") as file:
+            rows = [(int(row["timestamp"]), float(row["price_EUR_per_MWh"])) for row in csv.DictReader(file)]
+        self.store.save_prices(self.AREA, rows)
+
+    def refresh(self):
+        # Fetch only the tail after the last stored timestamp
+        last_ts = self.store.last_timestamp("prices", self.AREA)
+        if last_ts is None and os.path.exists(self.output_file):
+            self.import_csv()
+            last_ts = self.store.last_timestamp("prices", self.AREA)
+        if last_ts is None:
+            start = datetime(self.START_YEAR, 1, 1, tzinfo=timezone.utc)
+        else:
+            start = datetime.fromtimestamp(last_ts + 1, tz=timezone.utc)
+        new_data = self.fetch_since(start)
+        self.store.save_prices(self.AREA, [(entry["timestamp"], entry["price"]) for entry in new_data])
+        self.export()
 
+    def export(self):
         with open(self.output_file, mode="w", newline="", encoding="utf-8") as file:
             writer = csv.writer(file)
             writer.writerow(["timestamp", "datetime", "price_EUR_per_MWh"])
-            for entry in all_data:
-                ts = entry["timestamp"]
-                dt = datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
-                writer.writerow([ts, dt, entry["price"]])
+            for ts, price in self.store.prices(self.AREA):
+                dt = datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                writer.writerow([ts, dt, price])
         print(f"Saved electricity prices to {self.output_file}")
 
-    def load_or_fetch(self, reload=False):
-        if reload or not os.path.exists(self.output_file):
+    def load_or_fetch(self, reload=False, refresh=False):
+        if reload:
             self.fetch_all()
+        elif refresh or not os.path.exists(self.output_file):
+            self.refresh()
         else:
             print(f"Using cached electricity price data from {self.output_file}")
 
 
 class DataManager:
-    def __init__(self, lat, lon, reload=False):
-        self.pvgis = PVGISData(lat, lon)
-        self.electricity = ElectricityPriceData()
+    def __init__(self, lat, lon, reload=False, refresh=False, store=None, price_url=None, pvgis_url=None, max_workers=4):
+        self.store = store if store is not None else TimeSeriesStore()
+        self.session = make_session(pool_size=max_workers + 1)
+        self.pvgis = PVGISData(lat, lon, store=self.store, base_url=pvgis_url, session=self.session)
+        self.electricity = ElectricityPriceData(
+            store=self.store, base_url=price_url, session=self.session, max_workers=max_workers
+        )
 
         self.reload = reload
+        self.refresh = refresh
 
     def run(self):
-        self.pvgis.load_or_fetch(reload=self.reload)
-        self.electricity.load_or_fetch(reload=self.reload)
+        # PVGIS and the price years download at the same time
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            jobs = [
+                pool.submit(self.pvgis.load_or_fetch, reload=self.reload, refresh=self.refresh),
+                pool.submit(self.electricity.load_or_fetch, reload=self.reload, refresh=self.refresh),
+            ]
+            for job in jobs:
+                job.result()
 
 class Analytic:
     def create_folder_if_not_exists(self, folder_path):
@@ -143,22 +337,19 @@ class Analytic:
             print(f"Folder already exists: {folder_path}")
 
     def __init__(self, power):
-        # Load PV production data
-        pvsol = pd.read_csv(pvGISFile, parse_dates=["time"])
-        pvsol.rename(columns={"G(i)": "production_Wh_per_kW"}, inplace=True)
-
-        # Convert 'time' column to datetime
-        pvsol["time"] = pd.to_datetime(pvsol["time"])
-
-        # Load price data
-        prices = pd.read_csv(priceFile, parse_dates=["datetime"])
-        prices.rename(columns={"price_EUR_per_MWh": "price"}, inplace=True)
-
-        # Convert 'timestamp' column to datetime
-        prices["timestamp"] = pd.to_datetime(prices["datetime"])
-
-        # Merge on datetime (inner join to keep only matching timestamps)
-        merged = pd.merge(pvsol, prices, left_on="time", right_on="timestamp", how="inner")
+        # Load PV production and price data as sorted UTC epoch arrays
+        pv_ts, production_Wh_per_kW = load_pv_series()
+        price_ts, price = load_price_series()
+
+        # Align on UTC time (no DST gaps or duplicates): every price row takes the
+        # irradiance of the PVGIS hour it falls in, so 15-minute prices work as well
+        price_idx, pv_idx = asof_join(price_ts, pv_ts, tolerance=PV_STEP - 1)
+        merged = pd.DataFrame({
+            "timestamp": price_ts[price_idx],
+            "production_Wh_per_kW": production_Wh_per_kW[pv_idx] * step_hours(price_ts)[price_idx],
+            "price": price[price_idx],
+        })
+        merged["time"] = local_time(merged["timestamp"])
 
         # --- CALCULATIONS ---
         # Actual production (Wh) = 1kW production × power
@@ -189,17 +380,117 @@ class Analytic:
         yearly_profit.to_csv("result/yearly_profit.csv", index=False)
 
 
+
+class PortfolioAnalytic:
+    # Monthly and yearly revenue for many sites and capacities at once. Prices are loaded
+    # once, each site's irradiance is aligned to them once on UTC hours, and since revenue is linear in
+    # capacity the capacities are applied as a broadcast over the per-kW sums:
+    # sites x capacities x periods.
+    def __init__(self, sites, capacities_kw, store=None, session=None, max_workers=4, reload=False, refresh=False):
+        self.sites = list(sites)
+        self.capacities = np.asarray(capacities_kw, dtype=np.float64)
+        self.store = store if store is not None else TimeSeriesStore()
+        self.session = session or make_session(pool_size=max_workers)
+        self.max_workers = max_workers
+        self.reload = reload
+        self.refresh = refresh
+
+    def load_irradiance(self):
+        # Download sites missing from the store (every site with refresh or reload) in
+        # parallel, then read all of them. Nothing is exported: data/pvgis.csv stays the
+        # single-site series.
+        sources = [PVGISData(lat, lon, store=self.store, session=self.session) for lat, lon in self.sites]
+        if self.reload:
+            for source in sources:
+                self.store.clear_pvgis(source.location)
+        missing = [
+            source for source in sources
+            if self.refresh or self.store.last_timestamp("pvgis", source.location) is None
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(lambda source: source.refresh(export=False), missing))
+
+        irradiance = []
+        for source in sources:
+            df = source.load()
+            irradiance.append(_sorted_series(df["ts"].to_numpy(dtype=np.int64), df["g_i"].to_numpy(dtype=np.float64)))
+        return irradiance
+
+    def run(self):
+        # Load price data once
+        price_ts, price = load_price_series()
+        price = np.nan_to_num(price)
+
+        # Per-kW production of every site on the price time axis (hourly or 15-minute)
+        irradiance = self.load_irradiance()
+        price_hours = step_hours(price_ts)
+        production = np.zeros((len(self.sites), len(price_ts)))
+        matched = np.zeros((len(self.sites), len(price_ts)), dtype=bool)
+        for s, (pv_ts, production_Wh_per_kW) in enumerate(irradiance):
+            price_idx, pv_idx = asof_join(price_ts, pv_ts, tolerance=PV_STEP - 1)
+            production[s, price_idx] = np.nan_to_num(production_Wh_per_kW[pv_idx]) * price_hours[price_idx]
+            matched[s, price_idx] = True
+
+        # Revenue of 1 kW per price row: Wh -> MWh times EUR/MWh
+        revenue_per_kw = production / 1_000_000 * price
+
+        # Reporting periods in local time
+        time = local_time(price_ts)
+        tables = []
+        for period_type, periods in (
+            ("month", time.to_period("M").astype(str)),
+            ("year", time.year.astype(str)),
+        ):
+            codes, labels = pd.factorize(periods, sort=True)
+            per_kw = np.stack([np.bincount(codes, weights=row, minlength=len(labels)) for row in revenue_per_kw])
+            present = np.stack([np.bincount(codes, weights=row, minlength=len(labels)) > 0 for row in matched])
+
+            # sites x capacities x periods
+            revenue = per_kw[:, None, :] * self.capacities[None, :, None]
+            site_idx, cap_idx, period_idx = np.nonzero(np.broadcast_to(present[:, None, :], revenue.shape))
+            tables.append(pd.DataFrame({
+                "lat": [self.sites[i][0] for i in site_idx],
+                "lon": [self.sites[i][1] for i in site_idx],
+                "capacity_kw": self.capacities[cap_idx],
+                "period_type": period_type,
+                "period": np.asarray(labels)[period_idx],
+                "revenue_EUR": revenue[site_idx, cap_idx, period_idx].round(2),
+            }))
+        return pd.concat(tables, ignore_index=True)
+
+    def save(self, filename="result/portfolio_revenue.csv"):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        table = self.run()
+        table.to_csv(filename, index=False)
+        print(f"Saved portfolio revenue to {filename}")
+        return table
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Load PV and electricity price data.")
     parser.add_argument("--lat", type=float, default=58.547, help="Latitude for PVGIS")
     parser.add_argument("--lon", type=float, default=23.076, help="Longitude for PVGIS")
     parser.add_argument("--reload", action="store_true", help="Force re-download of all data")
+    parser.add_argument("--refresh", action="store_true", help="Download only data newer than the local store")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel downloads")
     parser.add_argument("--power_kw", type=float, default=200, help="Solar park power in kW")
+    parser.add_argument("--site", action="append", metavar="LAT,LON",
+                        help="Portfolio mode: site to evaluate (repeatable)")
+    parser.add_argument("--capacities", type=float, nargs="+", help="Portfolio mode: capacities in kW")
 
     args = parser.parse_args()
 
-    manager = DataManager(lat=args.lat, lon=args.lon, reload=args.reload)
-    manager.run()
-
-    analytic = Analytic(power=args.power_kw)
-
+    manager = DataManager(lat=args.lat, lon=args.lon, reload=args.reload, refresh=args.refresh, max_workers=args.workers)
+
+    if args.site:
+        # Only the prices here: PortfolioAnalytic fetches each site's irradiance, and
+        # --lat/--lon's site is not part of the portfolio
+        manager.electricity.load_or_fetch(reload=args.reload, refresh=args.refresh)
+        sites = [tuple(float(v) for v in site.split(",")) for site in args.site]
+        capacities = args.capacities or [args.power_kw]
+        PortfolioAnalytic(
+            sites, capacities, store=manager.store, session=manager.session, max_workers=args.workers,
+            reload=args.reload, refresh=args.refresh
+        ).save()
+    else:
+        manager.run()
+        analytic = Analytic(power=args.power_kw)
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+storeFile = "data/timeseries.sqlite"
+
+# PVGIS column name -> store column
+PVGIS_COLUMNS = {
+    "G(i)": "g_i",
+    "H_sun": "h_sun",
+    "T2m": "t2m",
+    "WS10m": "ws10m",
+    "Int": "int",
+}
+
+
+def year_of(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).year
+
+
+def location_key(lat, lon):
+    return f"{lat:.3f},{lon:.3f}"
+
+
+# Local SQLite store for hourly price and PVGIS series. Rows are keyed by UTC epoch
+# seconds and partitioned by year and by price area / PVGIS location; fetch_state
+# remembers the last fetched timestamp of every series so a refresh only downloads
+# the missing tail. One connection is shared between threads, guarded by a lock.
+class TimeSeriesStore:
+    def __init__(self, path=storeFile):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self._create_schema()
+
+    def _create_schema(self):
+        pvgis_columns = ", ".join(f"{column} REAL" for column in PVGIS_COLUMNS.values())
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS prices (
+                area TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                price REAL,
+                PRIMARY KEY (area, ts)
+            );
+            CREATE INDEX IF NOT EXISTS prices_by_year ON prices (area, year);
+
+            CREATE TABLE IF NOT EXISTS pvgis (
+                location TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                {pvgis_columns},
+                PRIMARY KEY (location, ts)
+            );
+            CREATE INDEX IF NOT EXISTS pvgis_by_year ON pvgis (location, year);
+
+            CREATE TABLE IF NOT EXISTS fetch_state (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                last_ts INTEGER NOT NULL,
+                PRIMARY KEY (source, key)
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # --- fetch bookkeeping ---
+
+    def last_timestamp(self, source, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT last_ts FROM fetch_state WHERE source = ? AND key = ?", (source, key)
+            ).fetchone()
+            return row[0] if row else None
+
+    def _mark_fetched(self, source, key, last_ts):
+        self.conn.execute(
+            "INSERT INTO fetch_state (source, key, last_ts) VALUES (?, ?, ?) "
+            "ON CONFLICT (source, key) DO UPDATE SET last_ts = MAX(last_ts, excluded.last_ts)",
+            (source, key, last_ts),
+        )
+
+    # --- electricity prices ---
+
+    def save_prices(self, area, rows):
+        # rows: iterable of (ts, price)
+        with self.lock:
+            rows = [(area, year_of(ts), ts, price) for ts, price in rows]
+            if not rows:
+                return
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO prices (area, year, ts, price) VALUES (?, ?, ?, ?)", rows
+                )
+                self._mark_fetched("prices", area, max(row[2] for row in rows))
+
+    def prices(self, area, start_year=None, end_year=None):
+        with self.lock:
+            query = "SELECT ts, price FROM prices WHERE area = ?"
+            params = [area]
+            if start_year is not None:
+                query += " AND year >= ?"
+                params.append(start_year)
+            if end_year is not None:
+                query += " AND year <= ?"
+                params.append(end_year)
+            return self.conn.execute(query + " ORDER BY ts", params).fetchall()
+
+    def clear_prices(self, area):
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM prices WHERE area = ?", (area,))
+                self.conn.execute("DELETE FROM fetch_state WHERE source = 'prices' AND key = ?", (area,))
+
+    # --- PVGIS irradiance ---
+
+    def save_pvgis(self, location, rows):
+        # rows: iterable of dicts with "ts" and any of the PVGIS_COLUMNS store names
+        with self.lock:
+            columns = list(PVGIS_COLUMNS.values())
+            rows = [
+                (location, year_of(row["ts"]), row["ts"]) + tuple(row.get(column) for column in columns)
+                for row in rows
+            ]
+            if not rows:
+                return
+            placeholders = ", ".join("?" * (3 + len(columns)))
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO pvgis (location, year, ts, {', '.join(columns)}) VALUES ({placeholders})",
+                    rows,
+                )
+                self._mark_fetched("pvgis", location, max(row[2] for row in rows))
+
+    def pvgis(self, location, start_year=None, end_year=None):
+        with self.lock:
+            columns = list(PVGIS_COLUMNS.values())
+            query = f"SELECT ts, {', '.join(columns)} FROM pvgis WHERE location = ?"
+            params = [location]
+            if start_year is not None:
+                query += " AND year >= ?"
+                params.append(start_year)
+            if end_year is not None:
+                query += " AND year <= ?"
+                params.append(end_year)
+            return self.conn.execute(query + " ORDER BY ts", params).fetchall()
+
+    def clear_pvgis(self, location):
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM pvgis WHERE location = ?", (location,))
+                self.conn.execute("DELETE FROM fetch_state WHERE source = 'pvgis' AND key = ?", (location,))
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+# Synthetic consumption profiles as array operations: hour-of-day factors for workdays
+# and weekends, schedule multipliers and noise are looked up / drawn for the whole
+# (households x steps) grid at once, so a year of 15-minute data for thousands of
+# households takes milliseconds instead of a Python loop per timestamp.
+
+# Apartment building day shapes (share of the daily consumption per hour)
+WEEKDAY_FACTORS = np.array([
+    0.01, 0.01, 0.005, 0.005, 0.005, 0.01, 0.02, 0.04, 0.08, 0.07, 0.06, 0.05,  # Morning
+    0.04, 0.03, 0.02, 0.05, 0.06, 0.08, 0.1, 0.12, 0.1, 0.08, 0.05, 0.02  # Evening
+])
+WEEKEND_FACTORS = np.array([
+    0.02, 0.02, 0.015, 0.015, 0.015, 0.02, 0.03, 0.06, 0.08, 0.08, 0.07, 0.06,  # Morning
+    0.06, 0.05, 0.04, 0.06, 0.08, 0.09, 0.1, 0.1, 0.09, 0.07, 0.05, 0.03  # Evening
+])
+
+# Workday multipliers: people leaving at 7 and home by 15-16 (x1.2), leaving at 9 and
+# home by 17-18 (x1.1)
+WORKDAY_SCHEDULE = np.ones(24)
+WORKDAY_SCHEDULE[[7, 8, 9, 17, 18, 19, 20]] *= 1.2
+WORKDAY_SCHEDULE[[9, 10, 11, 19, 20, 21]] *= 1.1
+
+
+def load_profiles(
+    start,
+    end,
+    freq="h",
+    households=1,
+    daily_kWh=84.0,
+    weekday_factors=WEEKDAY_FACTORS,
+    weekend_factors=WEEKEND_FACTORS,
+    workday_schedule=WORKDAY_SCHEDULE,
+    weekend_multiplier=1.2,
+    noise=0.1,
+    household_spread=0.0,
+    total_kWh=None,
+    seed=None
+):
+    # Average power (kW) per step for `households` profiles between start and end
+    # (inclusive) at `freq`. Returns (DatetimeIndex, (households, steps) array).
+    # noise: uniform +-share per step; household_spread: uniform +-share of each
+    # household's level; total_kWh rescales every household to that energy.
+    index = pd.date_range(start=start, end=end, freq=freq)
+    values = index.values
+    day = values.astype("datetime64[D]")
+    hour = ((values - day) // np.timedelta64(1, "h")).astype(np.int64)
+    weekday = (day.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+
+    weekday_factors = np.asarray(weekday_factors, dtype=np.float64)
+    weekend_factors = np.asarray(weekend_factors, dtype=np.float64)
+    weekday_factors = weekday_factors / weekday_factors.sum()
+    weekend_factors = weekend_factors / weekend_factors.sum()
+    workday = weekday < 5
+    shape = np.where(
+        workday,
+        weekday_factors[hour] * np.asarray(workday_schedule)[hour],
+        weekend_factors[hour] * weekend_multiplier,
+    )
+
+    rng = np.random.default_rng(seed)
+    level = daily_kWh * (1 + rng.uniform(-household_spread, household_spread, size=(households, 1)))
+    loads = level * shape * (1 + rng.uniform(-noise, noise, size=(households, len(index))))
+
+    if total_kWh is not None and len(index):
+        step_hours = pd.tseries.frequencies.to_offset(freq).nanos / 3.6e12
+        loads *= total_kWh / (loads.sum(axis=1, keepdims=True) * step_hours)
+    return index, loads
+
+
+def load_frame(index, loads, total=False):
+    # CSV-ready frame: date plus consumption_kW (one household or the summed fleet)
+    # or one household_<n> column per household
+    if total or len(loads) == 1:
+        return pd.DataFrame({"date": index, "consumption_kW": loads.sum(axis=0)})
+    columns = {f"household_{i + 1}": row for i, row in enumerate(loads)}
+    return pd.DataFrame({"date": index, **columns})
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Synthetic household/building load profiles')
+    parser.add_argument('--start', default='2024-01-01', help='First timestamp')
+    parser.add_argument('--end', default='2024-12-31 23:00:00', help='Last timestamp')
+    parser.add_argument('--freq', default='h', help='Resolution, e.g. h, 30min, 15min')
+    parser.add_argument('--households', type=int, default=1, help='Number of profiles')
+    parser.add_argument('--daily-kwh', type=float, default=84.0, help='Average daily consumption per profile')
+    parser.add_argument('--noise', type=float, default=0.1, help='Per-step random variation (+- share)')
+    parser.add_argument('--spread', type=float, default=0.0, help='Per-household level variation (+- share)')
+    parser.add_argument('--seed', type=int, help='Random seed')
+    parser.add_argument('--total', action='store_true', help='Write the summed fleet load instead of one column per profile')
+    parser.add_argument('--output', default='consumption_data_generated.csv', help='Output CSV')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index, loads = load_profiles(
+        args.start,
+        args.end,
+        freq=args.freq,
+        households=args.households,
+        daily_kWh=args.daily_kwh,
+        noise=args.noise,
+        household_spread=args.spread,
+        seed=args.seed,
+    )
+    elapsed = time.perf_counter() - started
+    load_frame(index, loads, args.total).to_csv(args.output, index=False)
+    print(f"{args.households} x {len(index)} load values generated in {elapsed * 1000:.0f} ms, saved to {args.output}")
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+# Columnar result format: a single structured .npy file with a datetime64[s]
+# "timestamp" field and one float64 field per numeric column. np.load with
+# mmap_mode="r" maps it without any parsing. CSV stays available as an export
+# format; the output path's extension picks the format.
+
+NPY_SUFFIX = ".npy"
+
+
+def is_columnar(path):
+    return str(path).endswith(NPY_SUFFIX)
+
+
+def to_records(df):
+    timestamps = pd.to_datetime(df["timestamp"])
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+
+    numeric = [c for c in df.columns if c != "timestamp" and pd.api.types.is_numeric_dtype(df[c])]
+    dtype = [("timestamp", "<M8[s]")] + [(c, "<f8") for c in numeric]
+    records = np.empty(len(df), dtype=dtype)
+    records["timestamp"] = timestamps.to_numpy().astype("datetime64[s]")
+    for c in numeric:
+        records[c] = df[c].to_numpy(dtype=np.float64)
+    return records
+
+
+def write_result(df, path):
+    if is_columnar(path):
+        np.save(path, to_records(df))
+    else:
+        df.to_csv(path, index=False)
+
+
+def read_result(path):
+    # Memory-mapped structured array for .npy, DataFrame for CSV; both index by column name
+    if is_columnar(path):
+        return np.load(path, mmap_mode="r")
+    return pd.read_csv(path, parse_dates=["timestamp"])
@@ -1,6 +1,16 @@
+import os
+import sys
+
 import matplotlib.pyplot as plt
 import pandas as pd
 
+from result_store import write_result
+
+# Instrumentation is shared with the web simulator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "web"))
+
+import instrumentation  # noqa: E402
+
 # Create a flexible simulation function for battery usage and grid interaction
 
 solar_park_power = 30
@@ -113,19 +123,32 @@ def plot_energy_analysis(df):
 "Simulation functions are ready. Please upload your CSV file with columns: timestamp, price, solar_generation, and consumption."
 
 
-# Read the CSV file
-df = pd.read_csv("scripts/simulation_data.csv", sep=';', parse_dates=["timestamp"])
-#july_df = df[df["timestamp"].dt.month == 7]
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Solar + battery simulation')
+    parser.add_argument('--output', default='simulation_output.csv', help='Output file; .npy writes the columnar format')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    # Read the CSV file
+    started = instrumentation.timer()
+    df = pd.read_csv("scripts/simulation_data.csv", sep=';', parse_dates=["timestamp"])
+    instrumentation.record("read", started, len(df))
+    #july_df = df[df["timestamp"].dt.month == 7]
 
-start_date = pd.to_datetime("2024-01-01")
-end_date = pd.to_datetime("2024-12-31 23:59:59")
-july_df = df[(df["timestamp"] >= start_date) & (df["timestamp"] <= end_date)]
+    start_date = pd.to_datetime("2024-01-01")
+    end_date = pd.to_datetime("2024-12-31 23:59:59")
+    july_df = df[(df["timestamp"] >= start_date) & (df["timestamp"] <= end_date)]
 
-result_df = simulate_energy_flow(july_df)
-plot_energy_analysis(result_df)
+    with instrumentation.stage("simulate", len(july_df)):
+        result_df = simulate_energy_flow(july_df)
+    plot_energy_analysis(result_df)
 
-# Save the updated DataFrame to a new file
-output_file = "simulation_output.csv"
-result_df.to_csv(output_file, index=False)
+    # Save the updated DataFrame to a new file
+    output_file = args.output
+    with instrumentation.stage("write", len(result_df)):
+        write_result(result_df, output_file)
 
-print(f"Updated file saved as: {output_file}")
+    print(f"Updated file saved as: {output_file}")
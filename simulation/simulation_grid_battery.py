@@ -1,13 +1,434 @@
+import os
+import sys
+
+import numpy as np
 import pandas as pd
 
+from result_store import write_result
+
+# The dispatch optimizer, instrumentation and load file columns are shared with the web simulator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "web"))
+
+import instrumentation  # noqa: E402
+from load_columns import pick_load_columns  # noqa: E402
+
 # Create a flexible simulation function for battery usage and grid interaction
 
+STRATEGIES = ("heuristic", "optimal", "rolling")
+
 inverter_power = 200
 battery_capacity_kWh = 600.0
 max_soc = 0.9
 min_soc = 0.1
 
+def _day_keys(timestamps):
+    # Calendar day of every row as an int64 day number (local wall time for tz-aware input)
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_localize(None)
+    values = timestamps.to_numpy().astype("datetime64[D]")
+    return values.astype(np.int64), np.isnat(values)
+
+
+def _step_hours(timestamps):
+    # Row length in hours from the median gap between timestamps (1 with fewer than two
+    # rows); whole hours stay ints so hourly input computes exactly as before
+    gaps = np.diff(timestamps.dropna().to_numpy().astype("datetime64[s]").astype(np.int64))
+    gaps = gaps[gaps > 0]
+    if len(gaps) == 0:
+        return 1
+    hours = float(np.median(gaps)) / 3600
+    return int(hours) if hours.is_integer() else hours
+
+
+def _dispatch(
+    solar,
+    wind,
+    price,
+    new_day,
+    charge_flag,
+    discharge_flag,
+    max_daily_throughput,
+    charge_efficiency,
+    discharge_efficiency,
+    step_power=None,
+    load=None
+):
+    # Per-row SoC recurrence over plain Python floats; the arithmetic mirrors
+    # simulate_energy_flow_iterrows step by step so hourly results are bit-identical.
+    # step_power: inverter energy per row (kWh), inverter_power when None.
+    # load: the site's consumption left after local use of generation; the battery
+    # covers it where it can and the rest is imported.
+    n = len(price)
+    if step_power is None:
+        step_power = inverter_power
+    has_load = load is not None
+    load = load.tolist() if has_load else None
+    solar = solar.tolist()
+    wind = wind.tolist()
+    price = price.tolist()
+    new_day = new_day.tolist()
+    charge_flag = charge_flag.tolist()
+    discharge_flag = discharge_flag.tolist()
+
+    out_soc = [0.0] * n
+    out_grid_import = [0.0] * n
+    out_grid_export = [0.0] * n
+    out_battery_charge = [0.0] * n
+    out_battery_discharge = [0.0] * n
+    out_grid_import_price = [0.0] * n
+    out_grid_export_revenue = [0.0] * n
+    out_battery_to_load = [0.0] * n
+
+    soc = battery_capacity_kWh * min_soc
+    charge_limit = battery_capacity_kWh * max_soc
+    discharge_limit = battery_capacity_kWh * min_soc
+    energy_moved_today = 0.0
+
+    for i in range(n):
+        if new_day[i]:
+            energy_moved_today = 0.0
+
+        total_gen = solar[i] + wind[i]
+        unit_price = price[i] / 1000
+        battery_charge_out = 0.0
+        grid_export_out = 0.0
+        revenue_out = 0.0
+
+        # First priority: Charge battery from renewable sources
+        if total_gen > 0:
+            if soc < charge_limit and energy_moved_today < max_daily_throughput:
+                max_charge_possible = min(charge_limit - soc, total_gen * charge_efficiency)
+                remaining_throughput = max_daily_throughput - energy_moved_today
+                actual_charge = min(max_charge_possible, remaining_throughput)
+                battery_charge = actual_charge * charge_efficiency
+
+                soc += battery_charge
+                total_gen -= battery_charge
+                battery_charge_out += battery_charge
+                energy_moved_today += actual_charge
+
+            # If there's any excess solar (either battery is full or we hit daily limit)
+            if total_gen > 0:
+                grid_export_out += total_gen
+                revenue_out += total_gen * unit_price
+
+        # Battery covers the site's remaining load, through the inverter it shares with
+        # the export discharge below
+        inverter_headroom = step_power
+        if has_load:
+            consumption = load[i]
+            if consumption > 0 and soc > discharge_limit and energy_moved_today < max_daily_throughput:
+                actual_discharge = min(soc - discharge_limit, consumption / discharge_efficiency,
+                                       max_daily_throughput - energy_moved_today, step_power)
+                delivered = actual_discharge * discharge_efficiency
+                soc -= actual_discharge
+                energy_moved_today += actual_discharge
+                inverter_headroom -= actual_discharge
+                consumption -= delivered
+                out_battery_discharge[i] = actual_discharge
+                out_battery_to_load[i] = delivered
+
+        # Charge from grid during cheapest hours
+        if charge_flag[i] and soc < charge_limit and energy_moved_today < max_daily_throughput:
+            remaining_throughput = max_daily_throughput - energy_moved_today
+            actual_charge = min(step_power, charge_limit - soc)
+            actual_charge = min(actual_charge, remaining_throughput)
+            out_grid_import[i] = actual_charge
+            out_grid_import_price[i] = actual_charge * unit_price
+            soc += actual_charge * charge_efficiency
+            energy_moved_today += actual_charge
+
+        # Discharge battery during expensive hours and export to grid
+        if discharge_flag[i] and soc > discharge_limit and energy_moved_today < max_daily_throughput:
+            available_discharge = soc - discharge_limit
+            max_discharge_possible = min(available_discharge, inverter_headroom)
+            remaining_throughput = max_daily_throughput - energy_moved_today
+            actual_discharge = min(max_discharge_possible, remaining_throughput)
+            grid_export = actual_discharge * discharge_efficiency
+            grid_export_out = grid_export
+            out_battery_discharge[i] += actual_discharge
+            revenue_out += grid_export * unit_price
+            soc -= actual_discharge
+            energy_moved_today += actual_discharge
+
+        # Whatever load is left comes from the grid
+        if has_load and consumption > 0:
+            out_grid_import[i] += consumption
+            out_grid_import_price[i] += consumption * unit_price
+
+        out_battery_charge[i] = battery_charge_out
+        out_grid_export[i] = grid_export_out
+        out_grid_export_revenue[i] = revenue_out
+        out_soc[i] = soc
+
+    result = {
+        "soc": out_soc,
+        "grid_import": out_grid_import,
+        "grid_export": out_grid_export,
+        "battery_charge": out_battery_charge,
+        "battery_discharge": out_battery_discharge,
+        "local_use": [0.0] * n,
+        "grid_import_price": out_grid_import_price,
+        "grid_export_revenue": out_grid_export_revenue,
+    }
+    if has_load:
+        result["battery_to_load"] = out_battery_to_load
+    return result
+
+
+def _plan_days(
+    day_key,
+    day_missing,
+    price,
+    generation,
+    charge_efficiency,
+    charge_hours_per_day,
+    discharge_hours_per_day,
+    step_power=None
+):
+    # Build the charge plan (cheapest rows) and discharge set (most expensive rows)
+    # of every day in one sorted pass. The per-day counts are in rows and step_power is
+    # the inverter energy per row. Returns row positions, not pandas labels.
+    if step_power is None:
+        step_power = inverter_power
+    positions = np.flatnonzero(~day_missing)
+    if len(positions) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    keys = day_key[positions]
+    prices = price[positions]
+
+    # Group rows by day; ties keep input order like nsmallest/nlargest(keep='first')
+    by_day = np.argsort(keys, kind="stable")
+    day_starts = np.flatnonzero(np.r_[True, keys[by_day][1:] != keys[by_day][:-1]])
+    group = np.empty(len(positions), dtype=np.intp)
+    group[by_day] = np.repeat(np.arange(len(day_starts)), np.diff(np.r_[day_starts, len(by_day)]))
+
+    cheap_order = np.lexsort((positions, prices, group))
+    expensive_order = np.lexsort((positions, -prices, group))
+    rank_start = np.repeat(day_starts, np.diff(np.r_[day_starts, len(by_day)]))
+    rank = np.arange(len(positions)) - rank_start
+
+    # Grid energy still needed after renewables, per day
+    total_daily_gen = np.bincount(group, weights=generation[positions], minlength=len(day_starts))
+    daily_needed_energy = (max_soc - min_soc) * battery_capacity_kWh
+    grid_energy_needed = np.maximum(daily_needed_energy - total_daily_gen * charge_efficiency, 0)
+
+    # Number of cheap rows consumed when the need is spread at step_power per row
+    charge_hours = np.zeros(len(day_starts), dtype=np.intp)
+    energy_remaining = grid_energy_needed.copy()
+    active = energy_remaining > 0
+    for _ in range(charge_hours_per_day):
+        charge_hours += active
+        energy_remaining = np.where(active, energy_remaining - np.minimum(step_power, energy_remaining), energy_remaining)
+        active &= energy_remaining > 0
+
+    cheap_group = group[cheap_order]
+    charge_idx = positions[cheap_order[rank < charge_hours[cheap_group]]]
+    discharge_idx = positions[expensive_order[rank < discharge_hours_per_day]]
+    return np.sort(charge_idx), np.sort(discharge_idx)
+
+
+def _dispatch_optimal(
+    solar,
+    wind,
+    price,
+    day_key,
+    max_daily_throughput,
+    charge_efficiency,
+    discharge_efficiency,
+    horizon=None,
+    load=None,
+    step_power=None
+):
+    # Profit-maximizing schedule under the same SoC, inverter, efficiency and daily
+    # throughput limits as _dispatch, over the whole input or a rolling window of
+    # `horizon` rows; returns the same columns. With load, discharge serves the
+    # remaining load before it is exported, and whatever load is left is imported.
+    from dispatch_optimizer import optimize_dispatch, rolling_dispatch, settle_flows
+
+    if step_power is None:
+        step_power = inverter_power
+    generation = np.nan_to_num(solar) + wind
+    args = (
+        price,
+        day_key,
+        battery_capacity_kWh,
+        min_soc,
+        max_soc,
+        step_power * charge_efficiency,
+        step_power,
+        charge_efficiency,
+        discharge_efficiency,
+        max_daily_throughput
+    )
+    if horizon is None:
+        energy_change, soc = optimize_dispatch(*args)
+    else:
+        energy_change, soc = rolling_dispatch(*args, horizon=horizon)
+    flows = settle_flows(energy_change, generation, price, charge_efficiency, discharge_efficiency, load=load)
+    result = {
+        "soc": soc,
+        "grid_import": flows["grid_import"],
+        "grid_export": flows["grid_export"],
+        "battery_charge": flows["battery_charge"],
+        "battery_discharge": flows["battery_discharge"],
+        "local_use": np.zeros(len(price)),
+        "grid_import_price": flows["grid_import_price"],
+        "grid_export_revenue": flows["grid_export_revenue"],
+    }
+    if load is not None:
+        result["battery_to_load"] = flows["battery_to_load"]
+    return result
+
+
 def simulate_energy_flow(
+    df,
+    max_cycles_per_day=2,
+    charge_efficiency=0.95,
+    discharge_efficiency=0.95,
+    charge_hours_per_day=3,
+    discharge_hours_per_day=3,
+    strategy="heuristic",
+    horizon=48,
+    load=None,
+    step_hours=None,
+    consumption=False
+):
+    # load: optional consumption Series indexed by timestamp, joined onto df;
+    # consumption=True models df's own "consumption" column instead (it is ignored
+    # otherwise, so older inputs with that column keep their results).
+    # step_hours: hours per row (0.25 for 15-minute data), inferred from the timestamps
+    # when None. The inverter limit is per row; the charge/discharge hours, the rolling
+    # horizon and the daily throughput keep their meaning in hours and days.
+    started = instrumentation.timer()
+    df = df.copy()
+
+    # Ensure timestamp column is properly parsed
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+
+    has_wind = "wind_generation" in df.columns
+    max_daily_throughput = battery_capacity_kWh * max_cycles_per_day
+    if step_hours is None:
+        step_hours = _step_hours(df["timestamp"])
+    step_power = inverter_power * step_hours
+
+    # Contiguous input arrays for planning and the dispatch loop
+    n = len(df)
+    solar = np.ascontiguousarray(df["solar_generation"].to_numpy(dtype=np.float64))
+    if has_wind:
+        wind = np.ascontiguousarray(df["wind_generation"].to_numpy(dtype=np.float64))
+        wind = np.where(np.isnan(wind), 0.0, wind)
+    else:
+        wind = np.zeros(n)
+    price = np.ascontiguousarray(df["price"].to_numpy(dtype=np.float64))
+
+    # Sites with load: generation covers consumption in the same row first and only
+    # the residual generation and load go through dispatch
+    if load is not None:
+        df["consumption"] = load.reindex(df["timestamp"]).fillna(0.0).to_numpy(dtype=np.float64)
+    has_load = load is not None or (consumption and "consumption" in df.columns)
+    remaining_load = None
+    local_use = None
+    if has_load:
+        site_load = np.nan_to_num(df["consumption"].to_numpy(dtype=np.float64))
+        generation = solar + wind
+        local_use = np.where((generation > 0) & (site_load > 0), np.minimum(generation, site_load), 0.0)
+        solar = generation - local_use
+        wind = np.zeros(n)
+        remaining_load = site_load - local_use
+
+    day_key, day_missing = _day_keys(df["timestamp"])
+    new_day = day_missing.copy()
+    new_day[0:1] = True
+    new_day[1:] |= day_key[1:] != day_key[:-1]
+    started = instrumentation.record("prepare", started, n)
+
+    if strategy in ("optimal", "rolling"):
+        result = _dispatch_optimal(
+            solar,
+            wind,
+            price,
+            day_key,
+            max_daily_throughput,
+            charge_efficiency,
+            discharge_efficiency,
+            int(round(horizon / step_hours)) if strategy == "rolling" else None,
+            remaining_load,
+            step_power
+        )
+        started = instrumentation.record("optimize", started, n)
+        result = _attach_columns(df, result, has_wind, local_use)
+        instrumentation.record("attach", started, n)
+        return result
+
+    # Precompute cheapest and most expensive hours for each day
+    charge_idx, discharge_idx = _plan_days(
+        day_key,
+        day_missing,
+        price,
+        np.nan_to_num(solar) + wind,
+        charge_efficiency,
+        int(round(charge_hours_per_day / step_hours)),
+        int(round(discharge_hours_per_day / step_hours)),
+        step_power
+    )
+
+    # A planned row acts on the row labelled one after it within the same day
+    planned_charge = np.zeros(n, dtype=bool)
+    planned_charge[charge_idx] = True
+    planned_discharge = np.zeros(n, dtype=bool)
+    planned_discharge[discharge_idx] = True
+
+    previous = df.index.get_indexer(df.index - 1)
+    has_previous = previous >= 0
+    previous = np.where(has_previous, previous, 0)
+    same_day = has_previous & (day_key[previous] == day_key) & ~day_missing
+    charge_flag = same_day & planned_charge[previous]
+    discharge_flag = same_day & planned_discharge[previous]
+    started = instrumentation.record("plan", started, n)
+
+    result = _dispatch(
+        solar,
+        wind,
+        price,
+        new_day,
+        charge_flag,
+        discharge_flag,
+        max_daily_throughput,
+        charge_efficiency,
+        discharge_efficiency,
+        step_power,
+        remaining_load
+    )
+    started = instrumentation.record("dispatch", started, n)
+    result = _attach_columns(df, result, has_wind, local_use)
+    instrumentation.record("attach", started, n)
+    return result
+
+
+def _attach_columns(df, result, has_wind, local_use=None):
+    # Attach all output columns in one go, in the same order as the row-by-row version
+    columns = {name: np.asarray(values, dtype=np.float64) for name, values in result.items()}
+    if local_use is not None:
+        columns["local_use"] = local_use
+    if not has_wind:
+        columns["wind_generation"] = np.zeros(len(df))
+    columns["date"] = df["timestamp"].dt.date
+    return df.assign(**columns)
+
+
+def read_load(filename):
+    # Consumption Series indexed by timestamp from a load CSV, using the same column
+    # names as the vanilla simulator
+    df = pd.read_csv(filename)
+    time_column, value_column = pick_load_columns(filename, df.columns)
+    load = pd.Series(df[value_column].to_numpy(dtype=np.float64), index=pd.to_datetime(df[time_column]))
+    return load[~load.index.duplicated(keep="last")]
+
+
+# Original row-by-row implementation, kept as the reference the array engine is checked against
+def simulate_energy_flow_iterrows(
     df,
     max_cycles_per_day=2,
     charge_efficiency=0.95,
@@ -149,30 +570,49 @@ def simulate_energy_flow(
 
 
 if __name__ == '__main__':
-    import sys
-    
-    # Check arguments
-    if len(sys.argv) not in [2, 4]:
-        print("Usage: python simulation_grid_battery.py <input_csv> [start_date end_date]")
-        sys.exit(1)
-        
-    input_file = sys.argv[1]
-    
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Grid battery simulation')
+    parser.add_argument('input_csv', help='Input CSV file')
+    parser.add_argument('dates', nargs='*', metavar='date', help='Optional start_date end_date')
+    parser.add_argument('--output', default='simulation_output.csv', help='Output file; .npy writes the columnar format')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='heuristic',
+                        help='Dispatch: cheapest/most expensive hours per day, the profit-maximizing schedule '
+                             'over the whole input, or the same with a rolling --horizon window')
+    parser.add_argument('--horizon', type=int, default=48, help='Rolling strategy lookahead in hours (e.g. 24-48)')
+    parser.add_argument('--load', help='Site consumption CSV joined by timestamp (instead of a consumption column)')
+    parser.add_argument('--consumption', action='store_true',
+                        help="Model the site load from the input's consumption column (ignored otherwise)")
+    parser.add_argument('--step-minutes', type=float,
+                        help='Minutes per input row, e.g. 15 (default: inferred from the timestamps)')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    if len(args.dates) not in [0, 2]:
+        parser.error("Usage: python simulation_grid_battery.py <input_csv> [start_date end_date]")
+
     # Read the CSV file
-    df = pd.read_csv(input_file, parse_dates=["timestamp"])
+    started = instrumentation.timer()
+    df = pd.read_csv(args.input_csv, parse_dates=["timestamp"])
+    instrumentation.record("read", started, len(df))
     
     # Apply date filtering if dates are provided
-    if len(sys.argv) == 4:
-        start_date = pd.to_datetime(sys.argv[2])
-        end_date = pd.to_datetime(sys.argv[3])
+    if args.dates:
+        start_date = pd.to_datetime(args.dates[0])
+        end_date = pd.to_datetime(args.dates[1])
         mask = (df["timestamp"].dt.date >= start_date.date()) & (df["timestamp"].dt.date <= end_date.date())
         df = df[mask]
 
     # Run simulation
-    result_df = simulate_energy_flow(df)
+    load = read_load(args.load) if args.load else None
+    step_hours = args.step_minutes / 60 if args.step_minutes else None
+    result_df = simulate_energy_flow(df, strategy=args.strategy, horizon=args.horizon, load=load, step_hours=step_hours,
+                                     consumption=args.consumption)
     
     # Save results
-    output_file = "simulation_output.csv"
-    result_df.to_csv(output_file, index=False)
+    output_file = args.output
+    with instrumentation.stage("write", len(result_df)):
+        write_result(result_df, output_file)
     
     print(f"Updated file saved as: {output_file}")
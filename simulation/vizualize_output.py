@@ -1,6 +1,8 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 
+from result_store import read_result
+
 solar_park_power = 200
 battery_capacity_kWh = 600.0
 
@@ -42,13 +44,19 @@ def plot_energy_analysis(df):
     fig.tight_layout()
     plt.show()
 
-# Read the CSV file
-df = pd.read_csv("simulation_output.csv", parse_dates=["timestamp"])
-#july_df = df[df["timestamp"].dt.month == 7]
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Plot a simulation result')
+    parser.add_argument('result_file', nargs='?', default='simulation_output.csv',
+                        help='Simulation output (.csv, or .npy which is memory-mapped)')
+    args = parser.parse_args()
 
-#start_date = pd.to_datetime("2024-07-01")
-#end_date = pd.to_datetime("2024-07-02 23:59:59")
-#df = df[(df["timestamp"] >= start_date) & (df["timestamp"] <= end_date)]
+    df = read_result(args.result_file)
+    #july_df = df[df["timestamp"].dt.month == 7]
 
-plot_energy_analysis(df)
+    #start_date = pd.to_datetime("2024-07-01")
+    #end_date = pd.to_datetime("2024-07-02 23:59:59")
+    #df = df[(df["timestamp"] >= start_date) & (df["timestamp"] <= end_date)]
 
+    plot_energy_analysis(df)
@@ -0,0 +1,173 @@
+import numpy as np
+
+# The vanilla battery rule (simulate_day in simulation_grid_battery_vanilla.py) over a
+# batch of series at once. Inputs are (batch, days, steps) arrays and every Python-level
+# step advances the whole batch by one row (an hour, or a quarter hour with
+# step_hours=0.25). A batch can be many input series under one configuration
+# (scenarios), one input under many configurations, or both: price and generation with
+# a batch size of 1 are shared by every configuration. The day plans
+# (cheapest charge hours, discharge hours) do not depend on SoC, so they are computed
+# for all days up front.
+
+CONFIG_FIELDS = (
+    "inverter_power",
+    "battery_capacity_kWh",
+    "charge_efficiency",
+    "discharge_efficiency",
+    "min_soc",
+    "max_soc",
+    "charge_hours_per_day",
+    "max_cycles_per_day",
+    "step_hours",
+)
+
+METRICS = ("import_cost", "export_revenue", "net_profit", "cycles", "discharged", "final_soc")
+
+
+def stack_configs(configs):
+    # One (configs,) array per BatteryConfig field; a single config gives length-1 arrays.
+    # step_hours must be set (see resolve_step in the vanilla simulator).
+    if hasattr(configs, "_fields"):
+        configs = [configs]
+    return {field: np.array([getattr(config, field) for config in configs], dtype=np.float64) for field in CONFIG_FIELDS}
+
+
+def _discharge_hours(usable_capacity, inverter_power, hours):
+    # Hours simulate_day selects to discharge the usable capacity, counted the same way
+    count = 0
+    remaining = usable_capacity
+    while remaining > 0 and count < hours:
+        remaining -= min(inverter_power, remaining)
+        count += 1
+    return count
+
+
+def plan_days(price, generation, params):
+    # Planned grid charge (kWh) and discharge mask per row, both (batch, days, steps).
+    # params is stack_configs() output; its arrays broadcast against the batch axis.
+    hours = price.shape[-1]
+    inverter_power = (params["inverter_power"] * params["step_hours"])[:, None, None]
+    usable_capacity = ((params["max_soc"] - params["min_soc"]) * params["battery_capacity_kWh"])[:, None, None]
+    charge_efficiency = params["charge_efficiency"][:, None, None]
+    charge_steps = np.rint(params["charge_hours_per_day"] / params["step_hours"])
+    charge_hours = np.minimum(charge_steps, hours).astype(np.int64)[:, None, None]
+    batch = np.broadcast_shapes(price.shape[:1], generation.shape[:1], inverter_power.shape[:1])[0]
+    shape = (batch,) + price.shape[1:]
+
+    # Grid charge fills what the day's generation cannot, cheapest hours first
+    total_from_renewables = generation.sum(axis=-1, keepdims=True) * charge_efficiency
+    grid_energy_needed = np.maximum(usable_capacity - total_from_renewables, 0)
+    cheap_count = int(charge_hours.max(initial=0))
+    cheapest = np.broadcast_to(np.argsort(price, axis=-1, kind="stable")[..., :cheap_count], shape[:-1] + (cheap_count,))
+    rank = np.arange(cheap_count)
+    planned = np.clip(grid_energy_needed - rank * inverter_power, 0, inverter_power)
+    planned = np.where(rank < charge_hours, planned, 0.0)
+    grid_charge = np.zeros(shape)
+    np.put_along_axis(grid_charge, cheapest, np.broadcast_to(planned, cheapest.shape), axis=-1)
+
+    # Discharge in the most expensive hours where generation leaves inverter headroom:
+    # walk the hours by descending price and take the first eligible ones
+    discharge_count = np.array([
+        _discharge_hours(usable, inverter, hours)
+        for usable, inverter in zip(usable_capacity.ravel().tolist(), inverter_power.ravel().tolist())
+    ])[:, None, None]
+    expensive = np.broadcast_to(np.argsort(-price, axis=-1, kind="stable"), shape)
+    eligible = np.broadcast_to(generation < inverter_power * 0.9, shape)
+    eligible_sorted = np.take_along_axis(eligible, expensive, axis=-1)
+    selected = eligible_sorted & (np.cumsum(eligible_sorted, axis=-1) <= discharge_count)
+    discharge = np.zeros(shape, dtype=bool)
+    np.put_along_axis(discharge, expensive, selected, axis=-1)
+    return grid_charge, discharge
+
+
+def simulate_batch(price, generation, config):
+    # price (EUR/MWh) and generation (kWh per row) are (batch, days, steps); config is a
+    # BatteryConfig or a list of them (one per batch entry). Returns per-entry totals:
+    # import_cost, export_revenue, discharged (kWh) and the final soc.
+    price = np.asarray(price, dtype=np.float64)
+    generation = np.asarray(generation, dtype=np.float64)
+    params = stack_configs(config)
+    grid_charge, discharge = plan_days(price, generation, params)
+    batch, days, hours = grid_charge.shape
+
+    # Time-major so every row is a contiguous (batch,) slice; shared inputs stay size 1
+    unit_price = np.ascontiguousarray(np.moveaxis(price / 1000, 0, -1))
+    generation = np.ascontiguousarray(np.moveaxis(generation, 0, -1))
+    grid_charge = np.ascontiguousarray(np.moveaxis(grid_charge, 0, -1))
+    discharge = np.ascontiguousarray(np.moveaxis(discharge, 0, -1))
+
+    inverter_power = params["inverter_power"] * params["step_hours"]
+    charge_efficiency = params["charge_efficiency"]
+    discharge_efficiency = params["discharge_efficiency"]
+    charge_limit = params["battery_capacity_kWh"] * params["max_soc"]
+    discharge_limit = params["battery_capacity_kWh"] * params["min_soc"]
+    max_daily_throughput = params["battery_capacity_kWh"] * params["max_cycles_per_day"]
+
+    soc = np.broadcast_to(discharge_limit, batch).copy()
+    import_cost = np.zeros(batch)
+    export_revenue = np.zeros(batch)
+    discharged = np.zeros(batch)
+    for d in range(days):
+        energy_moved_today = np.zeros(batch)
+        for h in range(hours):
+            total_gen = generation[d, h]
+            u = unit_price[d, h]
+
+            # Charge from renewables
+            charge = np.minimum(np.minimum(charge_limit - soc, total_gen * charge_efficiency),
+                                max_daily_throughput - energy_moved_today)
+            np.maximum(charge, 0, out=charge)
+            soc += charge
+            energy_moved_today += charge
+            total_gen = total_gen - charge / charge_efficiency
+
+            # Export excess renewable generation
+            grid_export = np.clip(total_gen, 0, inverter_power)
+            export_revenue += grid_export * u
+
+            # Grid charging in planned hours
+            charge = np.minimum(np.minimum(grid_charge[d, h], charge_limit - soc),
+                                max_daily_throughput - energy_moved_today)
+            np.maximum(charge, 0, out=charge)
+            soc += charge
+            energy_moved_today += charge
+            import_cost += charge / charge_efficiency * u
+
+            # Discharge in expensive hours
+            if discharge[d, h].any():
+                amount = np.minimum(np.minimum(inverter_power - grid_export, soc - discharge_limit),
+                                    np.minimum(inverter_power, max_daily_throughput - energy_moved_today))
+                amount = np.where(discharge[d, h], np.maximum(amount, 0), 0.0)
+                soc -= amount
+                energy_moved_today += amount
+                discharged += amount
+                export_revenue += amount * discharge_efficiency * u
+
+    return {
+        "import_cost": import_cost,
+        "export_revenue": export_revenue,
+        "discharged": discharged,
+        "soc": soc,
+    }
+
+
+def simulate_configs(price, generation, configs):
+    # Every configuration over one shared (days, steps) input in a single pass.
+    # Returns a (configs, len(METRICS)) matrix.
+    price = np.asarray(price, dtype=np.float64)[None]
+    generation = np.asarray(generation, dtype=np.float64)[None]
+    params = stack_configs(configs)
+    result = simulate_batch(price, generation, configs)
+
+    usable_capacity = (params["max_soc"] - params["min_soc"]) * params["battery_capacity_kWh"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cycles = np.where(usable_capacity > 0, result["discharged"] / usable_capacity, 0.0)
+    columns = {
+        "import_cost": result["import_cost"],
+        "export_revenue": result["export_revenue"],
+        "net_profit": result["export_revenue"] - result["import_cost"],
+        "cycles": cycles,
+        "discharged": result["discharged"],
+        "final_soc": result["soc"],
+    }
+    return np.column_stack([columns[metric] for metric in METRICS])
@@ -0,0 +1,317 @@
+import highspy
+import numpy as np
+
+# Profit-maximizing battery dispatch as a linear program, solved exactly with HiGHS
+# (pip install highspy).
+#
+# Every step has four variables, all battery-side kWh: charge from generation the
+# inverter cannot export (`free`, no cost), paid charge (generation that would otherwise
+# be sold, or grid import: price / charge_efficiency per kWh), discharge (earns price *
+# discharge_efficiency) and the SoC after the step, between min and max SoC. A balance
+# row per step links each SoC to the one before, and a row per day keeps the day's
+# charge plus discharge within the daily throughput limit. Charge and discharge limits
+# are per step, so generation, the inverter and the site's load can all shape them.
+#
+# The battery does not discharge into a negative price, where the LP could otherwise
+# charge and discharge in the same step to burn energy, nor while generation already
+# fills the inverter. At a negative price with free generation, paid charge is valued
+# as if the free energy were taken first, which is exact whenever the battery takes it.
+
+_NO_ENTRIES = (0, np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0))
+
+
+class _Program:
+    # The LP of a window of steps in one HiGHS instance: add() appends steps, drop()
+    # removes executed ones. HiGHS keeps its basis across both, so a re-solve starts
+    # from the previous solution
+    def __init__(self, low, high, charge_efficiency, discharge_efficiency, max_daily_throughput, start):
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue("output_flag", False)
+        # The chain of balance rows leaves presolve nothing to remove; dual simplex is
+        # the fastest HiGHS solver on it and the one that warm-starts
+        self.highs.setOptionValue("presolve", "off")
+        self.highs.setOptionValue("simplex_strategy", 1)
+        self.highs.changeObjectiveSense(highspy.ObjSense.kMaximize)
+        self.low = low
+        self.high = high
+        self.charge_efficiency = charge_efficiency
+        self.discharge_efficiency = discharge_efficiency
+        self.max_daily_throughput = max_daily_throughput
+        self.start = start
+        self.steps = 0
+        self.days = np.empty(0, dtype=np.int64)  # day label per step
+        self.balance_rows = np.empty(0, dtype=np.int64)  # balance row per step
+        self.day_rows = {}  # day label -> its throughput row
+
+    def add(self, price, day_id, max_charge, max_discharge, free):
+        # price in EUR/kWh, day_id int labels, the rest kWh per step: battery-side limits,
+        # and free generation before charge losses
+        steps = len(price)
+        if steps == 0:
+            return
+        columns = 4 * (self.steps + np.arange(steps))
+        max_discharge = np.where((price < 0) | (free > 0), 0.0, max_discharge)
+        costs = np.stack([np.zeros(steps), -price / self.charge_efficiency,
+                          price * self.discharge_efficiency, np.zeros(steps)], axis=1)
+        upper = np.stack([free * self.charge_efficiency, max_charge, max_discharge, np.full(steps, self.high)], axis=1)
+        lower = np.zeros((steps, 4))
+        lower[:, 3] = self.low
+        self.highs.addCols(4 * steps, costs.ravel(), lower.ravel(), upper.ravel(), *_NO_ENTRIES)
+
+        # Balance rows: soc - free - paid + discharge - previous soc = 0, or = the start
+        # SoC for the program's first step
+        indices = np.stack([columns, columns + 1, columns + 2, columns + 3, columns - 1], axis=1)
+        values = np.tile([-1.0, -1.0, 1.0, 1.0, -1.0], (steps, 1))
+        keep = np.ones((steps, 5), dtype=bool)
+        bound = np.zeros(steps)
+        if self.steps == 0:
+            keep[0, 4] = False
+            bound[0] = self.start
+        counts = keep.sum(axis=1)
+        self.balance_rows = np.r_[self.balance_rows, self.highs.getNumRow() + np.arange(steps)]
+        self.highs.addRows(steps, bound, bound, int(counts.sum()), np.r_[0, np.cumsum(counts)[:-1]].astype(np.int32),
+                           indices[keep].astype(np.int32), values[keep])
+
+        # Throughput rows: a day's charge plus discharge; a day continued from an earlier
+        # add() gets the new steps in its existing row
+        for day in np.unique(day_id).tolist():
+            day_columns = (columns[day_id == day][:, None] + np.arange(3)).ravel().astype(np.int32)
+            if day in self.day_rows:
+                for column in day_columns.tolist():
+                    self.highs.changeCoeff(self.day_rows[day], column, 1.0)
+                continue
+            self.day_rows[day] = self.highs.getNumRow()
+            self.highs.addRows(1, np.array([-highspy.kHighsInf]), np.array([self.max_daily_throughput]),
+                               len(day_columns), np.zeros(1, dtype=np.int32), day_columns, np.ones(len(day_columns)))
+        self.days = np.r_[self.days, day_id]
+        self.steps += steps
+
+    def drop(self, count, start):
+        # Remove the first `count` steps, after which the battery is at `start`, and the
+        # throughput rows of the days they finished. The next step's balance row loses
+        # its previous SoC with the deleted columns and is pinned to `start` instead.
+        remaining = set(np.unique(self.days[count:]).tolist())
+        finished = [day for day in self.day_rows if day not in remaining]
+        rows = np.sort(np.r_[self.balance_rows[:count], [self.day_rows.pop(day) for day in finished]]).astype(np.int32)
+        self.highs.deleteRows(len(rows), rows)
+        self.highs.deleteCols(4 * count, np.arange(4 * count, dtype=np.int32))
+
+        self.balance_rows = self.balance_rows[count:] - np.searchsorted(rows, self.balance_rows[count:])
+        self.day_rows = {day: row - int(np.searchsorted(rows, row)) for day, row in self.day_rows.items()}
+        self.days = self.days[count:]
+        self.steps -= count
+        self.start = start
+        if self.steps:
+            self.highs.changeRowBounds(int(self.balance_rows[0]), start, start)
+
+    def spend(self, day, moved):
+        # moved kWh of the day's throughput were used before the window starts
+        self.highs.changeRowBounds(self.day_rows[day], -highspy.kHighsInf, self.max_daily_throughput - moved)
+
+    def solve(self):
+        # SoC after every step, kept within its bounds against solver round-off
+        self.highs.run()
+        status = self.highs.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError(f"Dispatch LP not solved: {self.highs.modelStatusToString(status)}")
+        return np.clip(np.asarray(self.highs.getSolution().col_value)[3::4], self.low, self.high)
+
+
+def _step_arrays(price, steps, *limits):
+    # EUR/MWh prices as EUR/kWh, and every per-step limit as a float array
+    price = np.nan_to_num(np.asarray(price, dtype=np.float64)) / 1000
+    return (price, *(np.broadcast_to(np.asarray(limit, dtype=np.float64), steps) for limit in limits))
+
+
+def optimize_dispatch(
+    price,
+    day_id,
+    battery_capacity_kWh,
+    min_soc,
+    max_soc,
+    max_charge,
+    max_discharge,
+    charge_efficiency,
+    discharge_efficiency,
+    max_daily_throughput,
+    free=0.0
+):
+    # price: EUR/MWh per step; day_id: integer day label per step; max_charge/max_discharge:
+    # battery-side kWh limits per step (scalars or arrays); free: generation beyond the
+    # export limit per step, which the battery can store at no cost. Returns the
+    # battery-side energy change per step (positive = stored, negative = drawn) and the
+    # SoC after it.
+    steps = len(price)
+    low = battery_capacity_kWh * min_soc
+    high = battery_capacity_kWh * max_soc
+    if steps == 0 or high <= low:
+        return np.zeros(steps), np.full(steps, low)
+
+    price, max_charge, max_discharge, free = _step_arrays(price, steps, max_charge, max_discharge, free)
+    program = _Program(low, high, charge_efficiency, discharge_efficiency, max_daily_throughput, low)
+    program.add(price, np.asarray(day_id, dtype=np.int64), max_charge, max_discharge, free)
+    soc = program.solve()
+    return np.diff(np.r_[low, soc]), soc
+
+
+# Rolling-horizon variant for data that arrives over time (e.g. day-ahead prices each
+# afternoon). One LP holds the known window: extend() appends the new steps to it,
+# advance() executes the next ones and drops them, pinning the following step to the
+# battery's SoC and the day's throughput row to what is left of it. The plan is
+# followed as is and only re-solved once extend() has moved the end of the window;
+# HiGHS then starts from the previous basis, so the steps already planned are only
+# re-priced for the appended day instead of being solved again from scratch.
+class RollingPlanner:
+    def __init__(
+        self,
+        battery_capacity_kWh,
+        min_soc,
+        max_soc,
+        charge_efficiency,
+        discharge_efficiency,
+        max_daily_throughput
+    ):
+        self.low = battery_capacity_kWh * min_soc
+        self.high = battery_capacity_kWh * max_soc
+        self.soc = self.low
+        self.moved_today = 0.0
+        self.last_day = None
+        self.replans = 0
+
+        self.day_id = np.empty(0, dtype=np.int64)
+        self.program = None
+        if self.high > self.low:
+            self.program = _Program(
+                self.low, self.high, charge_efficiency, discharge_efficiency, max_daily_throughput, self.soc
+            )
+        self.plan = None
+
+    def __len__(self):
+        # Steps known but not yet executed
+        return len(self.day_id)
+
+    def extend(self, price, day_id, max_charge, max_discharge, free=0.0):
+        steps = len(price)
+        day_id = np.asarray(day_id, dtype=np.int64)
+        self.day_id = np.r_[self.day_id, day_id]
+        if self.program is not None:
+            price, max_charge, max_discharge, free = _step_arrays(price, steps, max_charge, max_discharge, free)
+            self.program.add(price, day_id, max_charge, max_discharge, free)
+            self._spend()
+        self.plan = None
+
+    def _spend(self):
+        # The day being executed keeps only what is left of its throughput
+        if self.last_day in self.program.day_rows:
+            self.program.spend(self.last_day, self.moved_today)
+
+    def advance(self, count):
+        # Execute the next `count` known steps; returns (energy_change, soc) like optimize_dispatch
+        count = min(count, len(self.day_id))
+        if count == 0:
+            return np.zeros(0), np.zeros(0)
+        if self.program is None:
+            self.day_id = self.day_id[count:]
+            return np.zeros(count), np.full(count, self.low)
+        if self.plan is None:
+            self.plan = self.program.solve()
+            self.replans += 1
+
+        day_id = self.day_id[:count]
+        soc = self.plan[:count]
+        energy_change = np.diff(np.r_[self.soc, soc])
+        moved = np.abs(energy_change)
+        if day_id[-1] == self.last_day:
+            self.moved_today += moved.sum()
+        else:
+            self.moved_today = moved[day_id == day_id[-1]].sum()
+        self.last_day = day_id[-1]
+        self.soc = soc[-1]
+
+        self.day_id = self.day_id[count:]
+        self.plan = self.plan[count:]
+        self.program.drop(count, self.soc)
+        self._spend()
+        return energy_change, soc
+
+
+def rolling_dispatch(
+    price,
+    day_id,
+    battery_capacity_kWh,
+    min_soc,
+    max_soc,
+    max_charge,
+    max_discharge,
+    charge_efficiency,
+    discharge_efficiency,
+    max_daily_throughput,
+    free=0.0,
+    horizon=48
+):
+    # Replay a full series through RollingPlanner: each day is executed once at least
+    # `horizon` steps (whole days) are known, which is what day-ahead data allows.
+    # Same arguments and return value as optimize_dispatch.
+    price = np.asarray(price, dtype=np.float64)
+    day_id = np.asarray(day_id)
+    steps = len(price)
+    max_charge = np.broadcast_to(max_charge, steps)
+    max_discharge = np.broadcast_to(max_discharge, steps)
+    free = np.broadcast_to(free, steps)
+
+    planner = RollingPlanner(
+        battery_capacity_kWh, min_soc, max_soc, charge_efficiency, discharge_efficiency, max_daily_throughput
+    )
+    bounds = np.flatnonzero(np.r_[True, day_id[1:] != day_id[:-1], True])
+    energy_change = np.empty(steps)
+    soc = np.empty(steps)
+    loaded = 0
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        while loaded < len(bounds) - 1 and bounds[loaded] - start < horizon:
+            a, b = bounds[loaded], bounds[loaded + 1]
+            planner.extend(price[a:b], day_id[a:b], max_charge[a:b], max_discharge[a:b], free[a:b])
+            loaded += 1
+        energy_change[start:end], soc[start:end] = planner.advance(end - start)
+    return energy_change, soc
+
+
+def settle_flows(energy_change, generation, price, charge_efficiency, discharge_efficiency, export_limit=None,
+                 load=None):
+    # Turn battery-side energy changes into grid flows and money. Charging uses
+    # generation first and imports the rest; surplus generation (capped at export_limit
+    # if given) and battery discharge are exported. With load (the site's consumption
+    # left after local use of generation), discharge serves it before anything is
+    # exported and the rest of it is imported. Import and export share the price, so
+    # this moves energy between the flows without changing the schedule's profit.
+    price = np.asarray(price, dtype=np.float64) / 1000
+    generation = np.asarray(generation, dtype=np.float64)
+    charge = np.maximum(energy_change, 0.0)
+    discharge = np.maximum(-energy_change, 0.0)
+
+    charge_input = charge / charge_efficiency
+    from_generation = np.minimum(generation, charge_input)
+    grid_import = charge_input - from_generation
+    surplus = generation - from_generation
+    if export_limit is not None:
+        surplus = np.minimum(surplus, export_limit)
+    delivered = discharge * discharge_efficiency
+    to_load = None
+    if load is not None:
+        remaining = np.maximum(np.asarray(load, dtype=np.float64), 0.0)
+        to_load = np.minimum(delivered, remaining)
+        delivered = delivered - to_load
+        grid_import = grid_import + (remaining - to_load)
+    grid_export = surplus + delivered
+
+    flows = {
+        "battery_charge": charge,
+        "battery_charge_renewable": from_generation * charge_efficiency,
+        "battery_discharge": discharge,
+        "grid_import": grid_import,
+        "grid_import_price": grid_import * price,
+        "grid_export": grid_export,
+        "grid_export_revenue": grid_export * price,
+    }
+    if to_load is not None:
+        flows["battery_to_load"] = to_load
+    return flows
@@ -0,0 +1,162 @@
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Per-stage timing for the simulators. Off by default: timer() returns 0.0 and record()
+# and stage() return at once, so the hooks left in the simulators cost nothing. A run is
+# instrumented with a simulator's --profile flag or the ENERGY_PROFILE environment
+# variable. Stage times, row counts, rows/sec and peak RSS are then written as one JSON
+# line, to stderr or appended to a log file. --cprofile / ENERGY_PROFILE_CPROFILE also
+# dump cProfile statistics of the whole run for pstats or snakeviz.
+#
+# Hot paths use the timer()/record() pair, which chains stages without nesting:
+#     started = instrumentation.timer()
+#     ...plan...
+#     started = instrumentation.record("plan", started, len(rows))
+#     ...dispatch...
+#     instrumentation.record("dispatch", started, len(rows))
+# Coarse blocks use `with instrumentation.stage("write", rows):`.
+
+ENV_OUTPUT = "ENERGY_PROFILE"
+ENV_CPROFILE = "ENERGY_PROFILE_CPROFILE"
+
+_session = None
+
+
+class _Session:
+    def __init__(self, output, cprofile_path):
+        self.output = output
+        self.cprofile_path = cprofile_path
+        self.created = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.started = time.perf_counter()
+        self.stages = {}  # name -> [seconds, calls, rows], in first-use order
+        self.profile = None
+        if cprofile_path:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+
+class _Stage:
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.started, self.rows)
+        return False
+
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def enable(output="-", cprofile_path=None, write_at_exit=True):
+    # Start instrumenting this process; output is a JSON log path, "-" for stderr or
+    # None to only collect (finish() returns the report)
+    global _session
+    _session = _Session(output, cprofile_path)
+    if write_at_exit:
+        atexit.register(finish)
+
+
+def enabled():
+    return _session is not None
+
+
+def timer():
+    return time.perf_counter() if _session is not None else 0.0
+
+
+def record(name, started, rows=0):
+    # Add the time since `started` (a timer() value) and `rows` to stage `name`;
+    # returns the current timer() value so the next stage can start from it
+    if _session is None:
+        return 0.0
+    now = time.perf_counter()
+    entry = _session.stages.setdefault(name, [0.0, 0, 0])
+    entry[0] += now - started
+    entry[1] += 1
+    entry[2] += rows
+    return now
+
+
+def stage(name, rows=0):
+    return _NULL_STAGE if _session is None else _Stage(name, rows)
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def report():
+    stages = []
+    for name, (seconds, calls, rows) in _session.stages.items():
+        stages.append({
+            "name": name,
+            "seconds": round(seconds, 6),
+            "calls": calls,
+            "rows": rows,
+            "rows_per_second": round(rows / seconds, 1) if rows and seconds > 0 else None,
+        })
+    return {
+        "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+        "argv": sys.argv[1:],
+        "pid": os.getpid(),
+        "started": _session.created,
+        "total_seconds": round(time.perf_counter() - _session.started, 6),
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "cprofile": _session.cprofile_path,
+    }
+
+
+def finish():
+    # Stop instrumenting, write the report (and the cProfile dump) and return it
+    global _session
+    if _session is None:
+        return None
+    if _session.profile is not None:
+        _session.profile.disable()
+        _session.profile.dump_stats(_session.cprofile_path)
+    result = report()
+    line = json.dumps(result)
+    if _session.output == "-":
+        print(line, file=sys.stderr)
+    elif _session.output:
+        with open(_session.output, "a") as f:
+            f.write(line + "\n")
+    _session = None
+    return result
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', nargs='?', const='-', metavar='JSON_LOG',
+                        help=f'Write per-stage timings as JSON to stderr or append them to JSON_LOG '
+                             f'(also enabled by ${ENV_OUTPUT})')
+    parser.add_argument('--cprofile', metavar='PSTATS',
+                        help=f'Dump cProfile statistics of the run to PSTATS (or ${ENV_CPROFILE})')
+
+
+def enable_from_args(args=None):
+    # Enable when --profile/--cprofile were given or the environment asks for it
+    output = getattr(args, "profile", None) or os.environ.get(ENV_OUTPUT)
+    cprofile_path = getattr(args, "cprofile", None) or os.environ.get(ENV_CPROFILE)
+    if output or cprofile_path:
+        enable(output or "-", cprofile_path)
@@ -0,0 +1,14 @@
+# Column names accepted in separate load files (--load), shared by the vanilla and the
+# pandas simulator so both read the same files
+
+LOAD_TIME_COLUMNS = ("timestamp", "date", "time")
+LOAD_VALUE_COLUMNS = ("consumption", "consumption_kW", "load_kWh", "load")
+
+
+def pick_load_columns(filename, fields):
+    # (time column, value column): the first known name of each among fields
+    time_column = next((c for c in LOAD_TIME_COLUMNS if c in fields), None)
+    value_column = next((c for c in LOAD_VALUE_COLUMNS if c in fields), None)
+    if time_column is None or value_column is None:
+        raise ValueError(f"{filename}: load file needs one of {LOAD_TIME_COLUMNS} and one of {LOAD_VALUE_COLUMNS}")
+    return time_column, value_column
@@ -0,0 +1,171 @@
+import csv
+import io
+import json
+
+import numpy as np
+
+import instrumentation
+
+# Compact plot payload for index.html, built on the server so the browser never parses
+# a full simulation output. For one result it holds:
+#   totals      the page's stats cards (sums, means for price and SoC)
+#   aggregates  day/week/month buckets of every numeric column
+#   series      the plotted columns, min-max downsampled to about `points` values each:
+#               every bucket keeps its minimum and maximum, so peaks survive
+#   window      the zoom window the series cover; a requested window of at most
+#               FULL_RESOLUTION_ROWS rows is sent at full resolution instead
+# Times are epoch seconds (UTC-naive, as in the output CSV), values are rounded to
+# DECIMALS, and every list is aligned with its "t" list.
+
+PLOT_COLUMNS = ("grid_import", "grid_export", "solar_generation", "wind_generation", "price", "soc", "consumption")
+MEAN_COLUMNS = ("price", "soc")
+PERIODS = ("day", "week", "month")
+DEFAULT_POINTS = 1000
+MAX_POINTS = 10000
+FULL_RESOLUTION_ROWS = 5000
+DECIMALS = 4
+
+
+def columns_from_rows(rows):
+    # Simulator result rows -> {"timestamp": datetime64[s], <numeric column>: float64}
+    columns = {"timestamp": np.array([row["timestamp"] for row in rows], dtype="datetime64[s]")}
+    for name, value in rows[0].items():
+        if name != "timestamp" and isinstance(value, (int, float)):
+            columns[name] = np.fromiter((row[name] for row in rows), dtype=np.float64, count=len(rows))
+    return columns
+
+
+def columns_from_csv(text):
+    # Same columns from an output CSV (e.g. a cached result)
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader)
+    values = list(zip(*reader))
+    columns = {"timestamp": np.array(values[header.index("timestamp")], dtype="datetime64[s]")}
+    for name, column in zip(header, values):
+        if name not in ("timestamp", "date"):
+            columns[name] = np.array(column, dtype=np.float64)
+    return columns
+
+
+def _epoch(timestamps):
+    return timestamps.astype("datetime64[s]").astype(np.int64)
+
+
+def _round(values):
+    return np.round(values, DECIMALS).tolist()
+
+
+def totals(columns):
+    return {
+        name: round(float(values.mean() if name in MEAN_COLUMNS else values.sum()), DECIMALS)
+        for name, values in columns.items() if name != "timestamp" and len(values)
+    }
+
+
+def _period_start(timestamps, period):
+    days = timestamps.astype("datetime64[D]")
+    if period == "day":
+        return days
+    if period == "week":
+        # Weeks start on Monday; day 0 (1970-01-01) was a Thursday
+        number = days.astype(np.int64)
+        return (number - (number + 3) % 7).astype("datetime64[D]")
+    if period == "month":
+        return timestamps.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unknown period: {period}")
+
+
+def aggregate(columns, period):
+    # Sum (mean for MEAN_COLUMNS) of every column per period; rows must be in time order
+    keys = _period_start(columns["timestamp"], period)
+    if not len(keys):
+        return {"t": [], "values": {}}
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    values = {}
+    for name, column in columns.items():
+        if name == "timestamp":
+            continue
+        sums = np.add.reduceat(column, starts)
+        values[name] = _round(sums / counts if name in MEAN_COLUMNS else sums)
+    return {"t": _epoch(keys[starts]).tolist(), "values": values}
+
+
+def minmax_indices(values, buckets):
+    # Indices of the minimum and maximum of each of at most `buckets` equal slices, in
+    # order. The values are padded to a buckets x width matrix, so one argmin/argmax
+    # per row finds them; indices that land in the padding are dropped.
+    count = len(values)
+    if count <= 2 * buckets:
+        return np.arange(count)
+    width = -(-count // buckets)
+    offsets = np.arange(buckets) * width
+    padded = np.full(buckets * width, np.inf)
+    padded[:count] = values
+    lows = padded.reshape(buckets, width).argmin(axis=1) + offsets
+    padded[count:] = -np.inf
+    highs = padded.reshape(buckets, width).argmax(axis=1) + offsets
+    keep = np.unique(np.concatenate([lows, highs]))
+    return keep[keep < count]
+
+
+def _window(timestamps, start, end):
+    # Row range [lo, hi) between two ISO dates/datetimes. An end date covers its whole day
+    # (up to, not including, the next midnight); an end datetime is included.
+    lo = 0 if not start else int(np.searchsorted(timestamps, np.datetime64(start, "s")))
+    if not end:
+        hi = len(timestamps)
+    else:
+        stop = np.datetime64(end)
+        if stop.dtype == np.dtype("datetime64[D]"):
+            hi = int(np.searchsorted(timestamps, (stop + np.timedelta64(1, "D")).astype("datetime64[s]"), side="left"))
+        else:
+            hi = int(np.searchsorted(timestamps, stop.astype("datetime64[s]"), side="right"))
+    return lo, max(lo, hi)
+
+
+def build_summary(columns, points=DEFAULT_POINTS, window_start=None, window_end=None):
+    # The payload described above. Zoom requests (with a window) leave out the
+    # aggregates, which the page already has from the overview.
+    points = max(2, min(int(points), MAX_POINTS))
+    timestamps = columns["timestamp"]
+    lo, hi = _window(timestamps, window_start, window_end)
+    window_times = _epoch(timestamps[lo:hi])
+    zoomed = bool(window_start or window_end) and hi - lo <= FULL_RESOLUTION_ROWS
+
+    series = {}
+    full_resolution = True
+    for name in PLOT_COLUMNS:
+        if name not in columns:
+            continue
+        values = columns[name][lo:hi]
+        keep = np.arange(len(values)) if zoomed else minmax_indices(values, points // 2)
+        full_resolution = full_resolution and len(keep) == len(values)
+        series[name] = {"t": window_times[keep].tolist(), "y": _round(values[keep])}
+
+    summary = {
+        "rows": len(timestamps),
+        "start": int(_epoch(timestamps[:1])[0]) if len(timestamps) else None,
+        "end": int(_epoch(timestamps[-1:])[0]) if len(timestamps) else None,
+        "totals": totals(columns),
+        "window": {
+            "start": int(window_times[0]) if len(window_times) else None,
+            "end": int(window_times[-1]) if len(window_times) else None,
+            "rows": hi - lo,
+            "full_resolution": full_resolution,
+        },
+        "series": series,
+    }
+    if not (window_start or window_end):
+        summary["aggregates"] = {period: aggregate(columns, period) for period in PERIODS}
+    return summary
+
+
+def summarize(columns, points=DEFAULT_POINTS, window_start=None, window_end=None):
+    with instrumentation.stage("summary", len(columns["timestamp"])):
+        return build_summary(columns, points, window_start, window_end)
+
+
+def write_summary(filename, columns, points=DEFAULT_POINTS, window_start=None, window_end=None):
+    with open(filename, "w") as f:
+        json.dump(summarize(columns, points, window_start, window_end), f, separators=(",", ":"))
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import suppress
+from datetime import datetime
+from functools import lru_cache
+
+# Content-addressed caches for repeated simulate.php requests, kept on disk so every
+# service worker and every direct CLI run shares them:
+#   <root>/inputs/<sha256 of the input>.npz        parsed columns (read_columns output)
+#   <root>/results/<sha256 of the request>.csv     simulation output
+# Both keys hash the simulator source along with the input content (and, for results,
+# the normalized parameters), so a parser or simulator change never serves stale
+# entries. Each directory is an LRU bounded in bytes: a hit touches the file's mtime and
+# an insert deletes the least recently used files until the directory fits. Files are
+# written to a temporary name and renamed, so concurrent readers never see a partial
+# entry.
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+DEFAULT_RESULT_BYTES = 512 * 2 ** 20
+DEFAULT_INPUT_BYTES = 256 * 2 ** 20
+DIGEST_MEMO_SIZE = 256
+
+# Modules whose code decides the simulation output
+SOURCE_FILES = ("simulation_grid_battery_vanilla.py", "dispatch_optimizer.py", "load_columns.py")
+
+
+def file_digest(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(2 ** 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# (path, mtime, size) -> content hash, so an unchanged file is hashed once per process
+_digests = {}
+
+
+def content_digest(filename):
+    stat = os.stat(filename)
+    identity = (os.path.realpath(filename), stat.st_mtime_ns, stat.st_size)
+    if identity not in _digests:
+        if len(_digests) >= DIGEST_MEMO_SIZE:
+            _digests.clear()
+        _digests[identity] = file_digest(filename)
+    return _digests[identity]
+
+
+@lru_cache(maxsize=1)
+def source_digest():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in SOURCE_FILES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def input_key(input_digest):
+    # Parsed columns depend on the input content and on read_columns()
+    return hashlib.sha256(f"{input_digest}:{source_digest()}".encode("utf-8")).hexdigest()
+
+
+def _iso_date(value):
+    # A --start/--end date as the simulator reads it, so "2024-1-1" and "2024-01-01"
+    # share a key; anything it cannot parse is kept as given
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return value
+
+
+def request_key(
+    input_digest, config, start=None, end=None, strategy="heuristic", horizon=48, load_digest=None, consumption=False
+):
+    # Hash of everything that decides a result. Parameters that cannot change it are
+    # normalized away: the date range needs both ends, the horizon only matters for the
+    # rolling strategy, dates are compared as ISO dates and numbers as floats
+    # (200 == 200.0).
+    params = {name: None if value is None else float(value) for name, value in config._asdict().items()}
+    params.update({
+        "input": input_digest,
+        "load": load_digest,
+        "consumption": bool(consumption),
+        "start": _iso_date(start) if start and end else None,
+        "end": _iso_date(end) if start and end else None,
+        "strategy": strategy,
+        "horizon": int(horizon) if strategy == "rolling" else None,
+        "source": source_digest(),
+    })
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class DiskLRU:
+    # Files named <key><suffix> in one directory, bounded to max_bytes in total
+    def __init__(self, directory, max_bytes, suffix):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        # Path of a cached entry, marked as recently used, or None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, write):
+        # write(path) creates the entry under a temporary name; returns the final path
+        # A name of our own rather than mkstemp(), which would create the file 0600 and
+        # lock out the other user when PHP and the service run under different accounts
+        temporary = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write(temporary)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(temporary)
+            raise
+        self.evict()
+        return self.path(key)
+
+    def put_file(self, key, source):
+        return self.put(key, lambda path: shutil.copyfile(source, path))
+
+    def evict(self):
+        # Delete least recently used entries until the directory fits in max_bytes
+        entries = []  # another process may evict the same files, hence the suppress()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                with suppress(FileNotFoundError):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+
+class SimulationCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, result_bytes=DEFAULT_RESULT_BYTES, input_bytes=DEFAULT_INPUT_BYTES):
+        self.results = DiskLRU(os.path.join(root, "results"), result_bytes, ".csv")
+        self.inputs = DiskLRU(os.path.join(root, "inputs"), input_bytes, ".npz")
+
+    def load_columns(self, filename):
+        # read_columns() output for a file, parsed at most once per distinct content
+        import numpy as np
+        from simulation_grid_battery_vanilla import read_columns
+
+        key = input_key(content_digest(filename))
+        path = self.inputs.get(key)
+        if path is not None:
+            try:
+                with np.load(path) as stored:
+                    return {name: stored[name] for name in stored.files}
+            except (OSError, ValueError):
+                pass  # evicted or damaged: parse again
+        columns = read_columns(filename)
+        self.inputs.put(key, lambda temporary: _save_columns(temporary, columns))
+        return columns
+
+    def get_result(self, key):
+        # Cached output CSV text, or None
+        path = self.results.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, newline="") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get_result_file(self, key, destination):
+        # Copy a cached output to destination; False on a miss
+        path = self.results.get(key)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, destination)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def put_result(self, key, text):
+        def write(path):
+            with open(path, "w", newline="") as f:
+                f.write(text)
+        self.results.put(key, write)
+
+    def put_result_file(self, key, source):
+        self.results.put_file(key, source)
+
+
+def _save_columns(path, columns):
+    # np.savez appends .npz to names without it, so write through a file object
+    import numpy as np
+
+    with open(path, "wb") as f:
+        np.savez(f, **columns)
@@ -0,0 +1,287 @@
+import csv
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import instrumentation
+import simulation_grid_battery_vanilla as sim
+from batch_kernel import simulate_batch
+
+# Monte Carlo scenarios for battery/PV sizing.
+#
+# History is cut into complete local days. Synthetic years are stitched together from
+# blocks of `block_days` consecutive days (weeks by default), one block per slot of
+# the year. Each block is drawn from the history blocks that start within
+# `season_days` of the slot's calendar position. Price, generation and consumption
+# of a block always come from the same real days, so their joint behaviour is kept.
+#
+# Every chunk of scenarios is simulated in one batched kernel call per configuration.
+# Chunks run across a process pool. Every scenario draws its blocks from its own random
+# stream, spawned from the seed by the scenario's index, so results depend neither on
+# the worker count nor on the chunk size, and every configuration sees the same
+# synthetic years.
+
+HOURS_PER_DAY = 24
+PV_PRICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "past_pv_price_calculator")
+DEFAULT_PRICES = os.path.join(PV_PRICE_DIR, "data", "electricity_prices_ee.csv")
+DEFAULT_IRRADIANCE = os.path.join(PV_PRICE_DIR, "data", "pvgis.csv")
+
+
+class History:
+    # Complete local days of hourly data: day (datetime64[D]) and (days, 24) arrays;
+    # solar is per unit of PV size, load is None without consumption data
+    def __init__(self, day, price, solar, wind, load=None):
+        self.day = day
+        self.price = price
+        self.solar = solar
+        self.wind = wind
+        self.load = load
+
+    @classmethod
+    def from_hours(cls, hour, price, solar, wind, load=None):
+        # hour: naive local datetime64[h] per row, in time order
+        hour = np.asarray(hour, dtype="datetime64[h]")
+        day = hour.astype("datetime64[D]")
+        first = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+        counts = np.diff(np.r_[first, len(day)])
+        columns = [price, solar, wind] + ([] if load is None else [load])
+        columns = [np.asarray(column, dtype=np.float64) for column in columns]
+
+        # Keep days with exactly 24 consecutive hours (drops DST switches and gaps) and no NaN
+        keep = counts == HOURS_PER_DAY
+        keep[keep] = (hour[first[keep] + HOURS_PER_DAY - 1] - hour[first[keep]]).astype(np.int64) == HOURS_PER_DAY - 1
+        rows = first[keep][:, None] + np.arange(HOURS_PER_DAY)
+        arrays = [column[rows] for column in columns]
+        valid = np.all([~np.isnan(array).any(axis=1) for array in arrays], axis=0)
+        arrays = [array[valid] for array in arrays]
+        return cls(day[first[keep]][valid], *arrays)
+
+    @classmethod
+    def from_simulation_csv(cls, filename):
+        # Simulator input (timestamp, price, solar_generation, wind_generation); PV size
+        # then scales solar_generation as given
+        columns = sim.read_columns(filename)
+        return cls.from_hours(
+            columns["timestamp"].astype("datetime64[h]"),
+            columns["price"],
+            columns["solar_generation"],
+            columns["wind_generation"],
+        )
+
+    @classmethod
+    def from_market_data(cls, prices_file=DEFAULT_PRICES, irradiance_file=DEFAULT_IRRADIANCE):
+        # Elering prices and PVGIS irradiance from past_pv_price_calculator; PV size is
+        # then in kWp (G(i) W/m2 ~ Wh per kWp and hour)
+        sys.path.insert(0, PV_PRICE_DIR)
+        from data_loader import asof_join, load_price_series, load_pv_series, local_time
+
+        price_ts, price = load_price_series(prices_file)
+        pv_ts, irradiance = load_pv_series(irradiance_file)
+        price_idx, pv_idx = asof_join(price_ts, pv_ts)
+        hour = local_time(price_ts[price_idx]).to_numpy().astype("datetime64[h]")
+        return cls.from_hours(hour, price[price_idx], irradiance[pv_idx] / 1000, np.zeros(len(price_idx)))
+
+    def with_consumption(self, filename):
+        # Join hourly consumption (date, consumption_kW in local time); days without a
+        # full day of consumption are dropped
+        with open(filename, newline="") as f:
+            rows = [(row["date"], sim.safe_float(row["consumption_kW"], np.nan)) for row in csv.DictReader(f)]
+        load_hour = np.array([row[0].replace(" ", "T") for row in rows], dtype="datetime64[h]")
+        load = np.array([row[1] for row in rows])
+        order = np.argsort(load_hour, kind="stable")
+        load_hour, load = load_hour[order], load[order]
+
+        hour = self.day[:, None] + np.arange(HOURS_PER_DAY).astype("timedelta64[h]")
+        pos = np.clip(np.searchsorted(load_hour, hour), 0, max(len(load_hour) - 1, 0))
+        found = load_hour[pos] == hour if len(load_hour) else np.zeros(hour.shape, dtype=bool)
+        joined = np.where(found, load[pos] if len(load) else np.nan, np.nan)
+        keep = ~np.isnan(joined).any(axis=1)
+        return History(self.day[keep], self.price[keep], self.solar[keep], self.wind[keep], joined[keep])
+
+
+def block_pools(history, block_days, season_days, slots):
+    # For every slot of the synthetic year, the start days of all history blocks of
+    # `block_days` consecutive days that begin within `season_days` of its calendar position
+    day = history.day.astype(np.int64)
+    starts = np.flatnonzero(day[block_days - 1:] - day[:len(day) - block_days + 1] == block_days - 1)
+    if len(starts) == 0:
+        raise ValueError(f"History has no {block_days} consecutive complete days")
+
+    year_start = history.day[starts].astype("datetime64[Y]").astype("datetime64[D]")
+    day_of_year = (history.day[starts] - year_start).astype(np.int64)
+    pools = []
+    for slot in range(slots):
+        distance = np.abs(day_of_year - slot * block_days)
+        distance = np.minimum(distance, 365 - distance)
+        pool = starts[distance <= season_days]
+        if len(pool) == 0:
+            pool = starts[distance == distance.min()]
+        pools.append(pool)
+    return pools
+
+
+def draw_days(pools, block_days, rngs):
+    # (scenarios, slots * block_days) history day indices, one scenario per generator
+    picks = np.stack([rng.random(len(pools)) for rng in rngs])
+    picks = (picks * [len(pool) for pool in pools]).astype(np.int64)
+    starts = np.stack([pool[picks[:, slot]] for slot, pool in enumerate(pools)], axis=1)
+    return (starts[:, :, None] + np.arange(block_days)).reshape(len(rngs), -1)
+
+
+# Per-worker state shared by every chunk
+_history = None
+_pools = None
+_settings = None
+
+
+def _init_worker(history, pools, settings):
+    global _history, _pools, _settings
+    _history = history
+    _pools = pools
+    _settings = settings
+
+
+def _run_chunk(start, scenarios, configs):
+    # Net profit of every configuration over scenarios start..start + scenarios - 1: (configs, scenarios)
+    rngs = [
+        np.random.default_rng(np.random.SeedSequence(_settings["seed"], spawn_key=(index,)))
+        for index in range(start, start + scenarios)
+    ]
+    days = draw_days(_pools, _settings["block_days"], rngs)
+    price = _history.price[days]
+    solar = _history.solar[days]
+    wind = _history.wind[days]
+    load = None if _history.load is None else _history.load[days] * _settings["load_scale"]
+
+    profits = np.empty((len(configs), scenarios))
+    for i, (config, pv) in enumerate(configs):
+        generation = solar * pv + wind
+        load_cost = 0.0
+        if load is not None:
+            # The site's own load is served from generation first; the rest is bought
+            load_cost = (np.maximum(load - generation, 0) * price / 1000).sum(axis=(1, 2))
+            generation = np.maximum(generation - load, 0)
+        result = simulate_batch(price, generation, config)
+        profits[i] = result["export_revenue"] - result["import_cost"] - load_cost
+    return profits
+
+
+def run_scenarios(
+    history,
+    settings_grid,
+    scenarios=1000,
+    seed=0,
+    block_days=7,
+    season_days=7,
+    load_scale=1.0,
+    chunk_size=250,
+    workers=None
+):
+    # settings_grid: (inverter, battery, efficiency, reserve, pv) tuples. Returns one
+    # summary dict per entry with mean and P10/P50/P90 net profit per synthetic year.
+    slots = 364 // block_days
+    pools = block_pools(history, block_days, season_days, slots)
+    configs = [
+        (sim.BatteryConfig.from_settings(inverter, battery, efficiency, reserve, step_hours=1), pv)
+        for inverter, battery, efficiency, reserve, pv in settings_grid
+    ]
+    settings = {"seed": seed, "block_days": block_days, "load_scale": load_scale}
+
+    starts = range(0, scenarios, chunk_size)
+    sizes = [min(chunk_size, scenarios - start) for start in starts]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(history, pools, settings)) as pool:
+        chunks = list(pool.map(_run_chunk, starts, sizes, itertools.repeat(configs)))
+    profits = np.concatenate(chunks, axis=1)
+
+    p10, p50, p90 = np.percentile(profits, [10, 50, 90], axis=1)
+    summaries = []
+    for i, (inverter, battery, efficiency, reserve, pv) in enumerate(settings_grid):
+        summaries.append({
+            "inverter": inverter,
+            "battery": battery,
+            "efficiency": efficiency,
+            "reserve": reserve,
+            "pv": pv,
+            "scenarios": scenarios,
+            "mean_profit": profits[i].mean(),
+            "p10_profit": p10[i],
+            "p50_profit": p50[i],
+            "p90_profit": p90[i],
+        })
+    return summaries
+
+
+def write_summary(filename, summaries):
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, list(summaries[0].keys()))
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Energy Analytics Monte Carlo scenarios')
+    parser.add_argument('--input', help='Simulator input CSV to resample (default: Elering prices + PVGIS irradiance)')
+    parser.add_argument('--prices', default=DEFAULT_PRICES, help='Price history CSV (timestamp, price_EUR_per_MWh)')
+    parser.add_argument('--irradiance', default=DEFAULT_IRRADIANCE, help='PVGIS export CSV (timestamp or time, G(i))')
+    parser.add_argument('--consumption', help='Hourly consumption CSV (date, consumption_kW) resampled with the same days')
+    parser.add_argument('--load-scale', type=float, default=1.0, help='Multiplier for the consumption data')
+    parser.add_argument('--inverter', type=int, nargs='+', default=[200], help='Inverter powers in kW')
+    parser.add_argument('--battery', type=int, nargs='+', default=[400], help='Battery capacities in kWh')
+    parser.add_argument('--efficiency', type=float, nargs='+', default=[0.94], help='Battery round-trip efficiencies (0-1)')
+    parser.add_argument('--reserve', type=float, nargs='+', default=[0.95], help='Battery reserve percentages (0-1)')
+    parser.add_argument('--pv', type=float, nargs='+', default=[1.0],
+                        help='PV sizes: kWp with PVGIS irradiance, or a multiple of solar_generation with --input')
+    parser.add_argument('--scenarios', type=int, default=1000, help='Number of synthetic years')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same results')
+    parser.add_argument('--block-days', type=int, default=7, help='Length of the resampled blocks in days')
+    parser.add_argument('--season-days', type=int, default=7, help='How far from its calendar slot a block may come from')
+    parser.add_argument('--chunk-size', type=int, default=250, help='Scenarios simulated per batched kernel call')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--output', default='scenario_summary.csv', help='Summary CSV, one row per configuration')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    if not args.input:
+        # The default history is data_loader.py's download, which may not have been run
+        for filename in (args.prices, args.irradiance):
+            if not os.path.exists(filename):
+                parser.error(
+                    f'{os.path.normpath(filename)} not found: run past_pv_price_calculator/data_loader.py first, '
+                    'or pass --prices/--irradiance or --input'
+                )
+
+    started = instrumentation.timer()
+    if args.input:
+        history = History.from_simulation_csv(args.input)
+    else:
+        history = History.from_market_data(args.prices, args.irradiance)
+    if args.consumption:
+        history = history.with_consumption(args.consumption)
+    if len(history.day) == 0:
+        parser.error('No complete days in the input data')
+    started = instrumentation.record("history", started, len(history.day) * HOURS_PER_DAY)
+
+    grid = list(itertools.product(args.inverter, args.battery, args.efficiency, args.reserve, args.pv))
+    summaries = run_scenarios(
+        history,
+        grid,
+        scenarios=args.scenarios,
+        seed=args.seed,
+        block_days=args.block_days,
+        season_days=args.season_days,
+        load_scale=args.load_scale,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+    )
+    # Rows are simulated hours over all scenarios and configurations
+    simulated_hours = (364 // args.block_days) * args.block_days * HOURS_PER_DAY
+    instrumentation.record("scenarios", started, args.scenarios * len(grid) * simulated_hours)
+    write_summary(args.output, summaries)
+    print(f"{args.scenarios} scenarios x {len(summaries)} configurations complete. Summary saved to {args.output}")
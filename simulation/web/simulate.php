@@ -4,40 +4,83 @@ header('Content-Type: application/json');
 // Configuration
 $uploadDir = 'uploads/';
 $pythonScript = 'simulation_grid_battery_vanilla.py';
+// Parsed-input and result cache shared with simulation_service.py (see result_cache.py)
+$cacheDir = 'cache/';
+$serviceUrl = getenv('SIMULATION_SERVICE_URL') ?: 'http://127.0.0.1:8765/simulate';
+// When set, per-stage simulator timings are appended to this file as JSON lines
+$profileLog = getenv('SIMULATION_PROFILE_LOG') ?: '';
+// Uploads are kept as an LRU bounded in bytes, like the caches in result_cache.py
+$uploadBytes = 256 * 1024 * 1024;
 
 // Create uploads directory if it doesn't exist
 if (!file_exists($uploadDir)) {
     mkdir($uploadDir, 0777, true);
 }
 
-try {
-    if ($_SERVER['REQUEST_METHOD'] !== 'POST') {
-        throw new Exception('Only POST method is allowed');
+// Delete the least recently used uploads (<sha256>.csv, touched on every use) until the
+// directory fits in $maxBytes; $keep is the upload of the current request
+function evictUploads($uploadDir, $maxBytes, $keep) {
+    clearstatcache();
+    $entries = [];
+    foreach (scandir($uploadDir) as $name) {
+        $path = $uploadDir . $name;
+        if (preg_match('/^[0-9a-f]{64}\.csv$/', $name) && ($stat = @stat($path)) !== false) {
+            $entries[] = [$stat['mtime'], $stat['size'], $path];
+        }
     }
-
-    if (!isset($_FILES['file'])) {
-        throw new Exception('No file uploaded');
+    $total = array_sum(array_column($entries, 1));
+    sort($entries);
+    foreach ($entries as [$mtime, $size, $path]) {
+        if ($total <= $maxBytes) {
+            break;
+        }
+        if ($path !== $keep) {
+            @unlink($path);  // another request may have deleted it already
+            $total -= $size;
+        }
     }
+}
 
-    $file = $_FILES['file'];
-    if ($file['error'] !== UPLOAD_ERR_OK) {
-        throw new Exception('File upload failed with error code ' . $file['error']);
+try {
+    if ($_SERVER['REQUEST_METHOD'] !== 'POST') {
+        throw new Exception('Only POST method is allowed');
     }
 
-    // Validate file type
-    $mimeType = mime_content_type($file['tmp_name']);
-    if ($mimeType !== 'text/csv' && $mimeType !== 'text/plain') {
-        throw new Exception('Invalid file type. Only CSV files are allowed.');
+    $timestamp = time();
+    if (!empty($_POST['input_hash'])) {
+        // Follow-up request (zoom window, CSV download) for a file uploaded before
+        $inputHash = $_POST['input_hash'];
+        if (!preg_match('/^[0-9a-f]{64}$/', $inputHash) || !file_exists($uploadDir . $inputHash . '.csv')) {
+            throw new Exception('Unknown input file, please upload it again');
+        }
+    } else {
+        if (!isset($_FILES['file'])) {
+            throw new Exception('No file uploaded');
+        }
+
+        $file = $_FILES['file'];
+        if ($file['error'] !== UPLOAD_ERR_OK) {
+            throw new Exception('File upload failed with error code ' . $file['error']);
+        }
+
+        // Validate file type
+        $mimeType = mime_content_type($file['tmp_name']);
+        if ($mimeType !== 'text/csv' && $mimeType !== 'text/plain') {
+            throw new Exception('Invalid file type. Only CSV files are allowed.');
+        }
+
+        // Store uploads by content hash, so re-uploading the same file reuses it and the
+        // simulator's parsed-input and result caches (keyed by the same hash) stay warm
+        $inputHash = hash_file('sha256', $file['tmp_name']);
     }
+    $uploadedFile = $uploadDir . $inputHash . '.csv';
 
-    // Create a unique filename
-    $timestamp = time();
-    $uploadedFile = $uploadDir . $timestamp . '_' . basename($file['name']);
-    
-    // Move uploaded file
-    if (!move_uploaded_file($file['tmp_name'], $uploadedFile)) {
+    if (file_exists($uploadedFile)) {
+        touch($uploadedFile);
+    } elseif (!move_uploaded_file($file['tmp_name'], $uploadedFile)) {
         throw new Exception('Failed to move uploaded file');
     }
+    evictUploads($uploadDir, $uploadBytes, $uploadedFile);
 
     // Get parameters
     $startDate = !empty($_POST['start_date']) ? $_POST['start_date'] : '';
@@ -49,15 +92,68 @@ try {
     $efficiency = (100 - $efficiencyLoss) / 100;
     $reserve = (100 - $batteryReserve/2) / 100;
 
-    // Build command with all parameters
+    // With summary=1 the page gets the aggregated, downsampled plot payload
+    // (plot_summary.py) instead of the full CSV; a zoom window sends full-resolution rows
+    $summary = !empty($_POST['summary']);
+    $points = !empty($_POST['points']) ? max(2, min(10000, intval($_POST['points']))) : 1000;
+    $windowStart = !empty($_POST['window_start']) ? $_POST['window_start'] : null;
+    $windowEnd = !empty($_POST['window_end']) ? $_POST['window_end'] : null;
+
+    // Forward to the simulation service (simulation_service.py) when it is running
+    $payload = json_encode([
+        'input_file' => realpath($uploadedFile),
+        'inverter' => $inverterPower,
+        'battery' => $batteryCapacity,
+        'efficiency' => round($efficiency, 2),
+        'reserve' => round($reserve, 2),
+        'start' => (!empty($startDate) && !empty($endDate)) ? $startDate : null,
+        'end' => (!empty($startDate) && !empty($endDate)) ? $endDate : null,
+        'profile' => $profileLog !== '',
+        'csv' => !$summary,
+        'summary' => $summary ? [
+            'points' => $points,
+            'window_start' => $windowStart,
+            'window_end' => $windowEnd,
+        ] : false,
+    ]);
+    $context = stream_context_create([
+        'http' => [
+            'method' => 'POST',
+            'header' => "Content-Type: application/json\r\n",
+            'content' => $payload,
+            'timeout' => 300,
+            'ignore_errors' => true,
+        ]
+    ]);
+    $response = @file_get_contents($serviceUrl, false, $context);
+    if ($response !== false) {
+        $result = json_decode($response, true);
+        if ($result === null) {
+            throw new Exception('Invalid response from simulation service');
+        }
+        if (empty($result['success'])) {
+            throw new Exception($result['error'] ?? 'Simulation failed');
+        }
+        if (isset($result['profile'])) {
+            file_put_contents($profileLog, json_encode($result['profile']) . "\n", FILE_APPEND | LOCK_EX);
+            unset($result['profile']);
+        }
+        $result['input_hash'] = $inputHash;
+        echo json_encode($result);
+        exit;
+    }
+
+    // Fall back to running the simulator directly, with a per-request output file
+    $resultFile = $uploadDir . $timestamp . '_' . getmypid() . '_output.csv';
     $command = sprintf(
-        'python3 %s %s --inverter %d --battery %d --efficiency %.2f --reserve %.2f',
+        'python3 %s %s --inverter %d --battery %d --efficiency %.2f --reserve %.2f --output %s',
         escapeshellarg($pythonScript),
         escapeshellarg($uploadedFile),
         $inverterPower,
         $batteryCapacity,
         $efficiency,
-        $reserve
+        $reserve,
+        escapeshellarg($resultFile)
     );
 
     // Add date parameters if provided
@@ -69,6 +165,23 @@ try {
         );
     }
 
+    $command .= ' --cache-dir ' . escapeshellarg($cacheDir);
+
+    $summaryFile = $uploadDir . $timestamp . '_' . getmypid() . '_summary.json';
+    if ($summary) {
+        $command .= sprintf(' --summary %s --points %d', escapeshellarg($summaryFile), $points);
+        if ($windowStart !== null) {
+            $command .= ' --window-start ' . escapeshellarg($windowStart);
+        }
+        if ($windowEnd !== null) {
+            $command .= ' --window-end ' . escapeshellarg($windowEnd);
+        }
+    }
+
+    if ($profileLog !== '') {
+        $command .= ' --profile ' . escapeshellarg($profileLog);
+    }
+
     // Execute simulation
     $output = [];
     $returnVar = 0;
@@ -79,21 +192,23 @@ try {
     }
 
     // Read simulation results
-    $resultFile = 'simulation_output.csv';
     if (!file_exists($resultFile)) {
         throw new Exception('Simulation output file not found');
     }
 
-    $simulationData = file_get_contents($resultFile);
-    
+    $response = ['success' => true, 'input_hash' => $inputHash];
+    if ($summary) {
+        $response['summary'] = json_decode(file_get_contents($summaryFile), true);
+        unlink($summaryFile);
+    } else {
+        $response['csv'] = file_get_contents($resultFile);
+    }
+
     // Clean up
-    //unlink($uploadedFile);
+    unlink($resultFile);
 
     // Return success response with data
-    echo json_encode([
-        'success' => true,
-        'data' => base64_encode($simulationData)
-    ]);
+    echo json_encode($response);
 
 } catch (Exception $e) {
     http_response_code(400);
@@ -1,13 +1,59 @@
 import csv
-from datetime import datetime
+import io
+import json
+import math
+import os
+import statistics
+from datetime import datetime, timedelta
 from collections import defaultdict
+from itertools import chain, groupby, islice
+from typing import NamedTuple
+
+import instrumentation
+from load_columns import pick_load_columns
+
+
+class BatteryConfig(NamedTuple):
+    # Immutable simulation parameters, passed explicitly so runs can share a process
+    inverter_power: float = 200
+    battery_capacity_kWh: float = 400
+    charge_efficiency: float = 0.94 ** 0.5
+    discharge_efficiency: float = 0.94 ** 0.5
+    min_soc: float = 0.05
+    max_soc: float = 0.95
+    charge_hours_per_day: int = 5
+    max_cycles_per_day: float = 3
+    # Hours covered by one input row (0.25 for 15-minute data); None infers it from the
+    # timestamps. Inverter power (kW) becomes energy per row through it.
+    step_hours: float = None
+
+    @classmethod
+    def from_settings(cls, inverter, battery, efficiency, reserve, **kwargs):
+        # Build a config from the CLI/web settings: round-trip efficiency and reserve
+        # Calculate charge/discharge efficiency as square root of round-trip efficiency
+        efficiency_per_cycle = efficiency ** 0.5
+        return cls(
+            inverter_power=inverter,
+            battery_capacity_kWh=battery,
+            charge_efficiency=efficiency_per_cycle,
+            discharge_efficiency=efficiency_per_cycle,
+            min_soc=1 - reserve,
+            max_soc=reserve,
+            **kwargs
+        )
+
+    @property
+    def usable_capacity(self):
+        return (self.max_soc - self.min_soc) * self.battery_capacity_kWh
+
+    @property
+    def step_power(self):
+        # Energy (kWh) the inverter can move in one row
+        return self.inverter_power * self.step_hours
+
+    def hours_to_steps(self, hours):
+        return int(round(hours / self.step_hours))
 
-# Simulation configuration
-#max_soc = 0.9
-#min_soc = 0.1
-charge_hours_per_day = 5
-discharge_hours_per_day = 4
-max_cycles_per_day = 2
 
 def safe_float(value, default=0.0):
     try:
@@ -15,160 +61,836 @@ def safe_float(value, default=0.0):
     except (ValueError, TypeError):
         return default
 
-def parse_csv(filename):
+def _parse_timestamp(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+
+# Numeric input columns; empty generation and consumption cells mean 0, price is required
+REQUIRED_COLUMNS = ("timestamp", "price", "solar_generation")
+OPTIONAL_ZERO_COLUMNS = ("solar_generation", "wind_generation", "consumption")
+# Bad rows listed in a read_columns error
+MAX_REPORTED_ERRORS = 20
+
+def _stream_float(row, name, line, errors):
+    # One numeric cell by read_columns' rules; bad cells are recorded in errors
+    value = row.get(name, "")
+    if not value and name in OPTIONAL_ZERO_COLUMNS:
+        return 0.0
+    number = safe_float(value, math.nan)
+    if not math.isfinite(number):
+        errors.append((line, name, value))
+    return number
+
+def _parse_row(row, line, errors, separator=" ", consumption=False):
+    # One input row as a simulator row, checked like read_columns: the timestamp must use
+    # the first row's layout, problems are recorded in errors as (line, column, value)
+    value = row["timestamp"]
+    try:
+        if len(value) != 19 or value[10] != separator:
+            raise ValueError(value)
+        timestamp = datetime.strptime(value, f"%Y-%m-%d{separator}%H:%M:%S")
+    except ValueError:
+        errors.append((line, "timestamp", value))
+        timestamp = None
+    price = _stream_float(row, "price", line, errors)
+    solar = _stream_float(row, "solar_generation", line, errors)
+    wind = _stream_float(row, "wind_generation", line, errors)
+    load = _stream_float(row, "consumption", line, errors) if "consumption" in row else None
+
+    parsed = {
+        "timestamp": timestamp,
+        "date": timestamp.date() if timestamp else None,
+        "solar_generation": solar,
+        "wind_generation": wind,
+        "price": price,
+    }
+    # Sites with load carry it in a consumption column (kWh per row), modelled only when
+    # asked for
+    if consumption and load is not None:
+        parsed["consumption"] = load
+    return parsed
+
+def iter_csv(filename, consumption=False):
+    # Yield parsed rows one at a time without holding the file in memory, checked by the
+    # same rules as read_columns. Rows stop at the first bad one; the rest of the file is
+    # only scanned for the report, then the same ValueError is raised, so whatever was
+    # simulated before it stays in the output.
+    errors = []
     with open(filename, newline='') as f:
-        reader = csv.DictReader(f)
-        data = []
-        for row in reader:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        missing = [name for name in REQUIRED_COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"{filename}: missing columns {', '.join(missing)}")
+        separator = None
+        for line, record in enumerate(reader, 2):
+            if not record:
+                continue
+            if len(record) != len(header):
+                errors.append((line, None, ",".join(record)))
+                continue
+            row = dict(zip(header, record))
+            if separator is None:
+                separator = row["timestamp"][10:11] if row["timestamp"][10:11] in (" ", "T") else " "
+            parsed = _parse_row(row, line, errors, separator, consumption)
+            if not errors:
+                yield parsed
+    if errors:
+        raise _bad_values(filename, errors)
+
+def parse_csv(filename, cache=None, consumption=False):
+    # Rows for the simulators, parsed through read_columns or taken from a
+    # result_cache.SimulationCache when one is given. A consumption column is only
+    # kept (and the site load modelled) with consumption=True.
+    started = instrumentation.timer()
+    columns = read_columns(filename) if cache is None else cache.load_columns(filename)
+    if not consumption:
+        columns = {name: values for name, values in columns.items() if name != "consumption"}
+    started = instrumentation.record("parse", started, len(columns["timestamp"]))
+    rows = rows_from_columns(columns)
+    instrumentation.record("build_rows", started, len(rows))
+    return rows
+
+def _float_column(values, name, lines, errors):
+    # One numeric column as float64 in a single numpy conversion; cells that do not parse
+    # or are not finite are recorded in errors as (line, column, value)
+    import numpy as np
+
+    if name in OPTIONAL_ZERO_COLUMNS:
+        values = [value or "0" for value in values]
+    try:
+        column = np.array(values, dtype=np.float64)
+    except ValueError:
+        column = np.array([safe_float(value, np.nan) for value in values])
+    for i in np.flatnonzero(~np.isfinite(column)).tolist():
+        errors.append((lines[i], name, values[i]))
+    return column
+
+def _timestamp_column(values, lines, errors):
+    # "%Y-%m-%d %H:%M:%S" or "%Y-%m-%dT%H:%M:%S", whichever the first row uses, as
+    # datetime64[s]; rows in another layout or with impossible dates are recorded in errors
+    import numpy as np
+
+    strings = np.array(values, dtype="U")
+    separator = values[0][10:11] if values else " "
+    if separator not in (" ", "T"):
+        separator = " "
+    valid = (np.strings.str_len(strings) == 19) & (np.strings.find(strings, separator) == 10)
+    column = np.full(len(strings), np.datetime64("NaT"), dtype="datetime64[s]")
+    try:
+        column[valid] = strings[valid].astype("datetime64[s]")
+    except ValueError:
+        for i in np.flatnonzero(valid).tolist():
             try:
-                timestamp = datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S")
+                column[i] = np.datetime64(values[i], "s")
             except ValueError:
-                timestamp = datetime.strptime(row["timestamp"], "%Y-%m-%dT%H:%M:%S")
-
-            solar = safe_float(row["solar_generation"])
-            wind = safe_float(row["wind_generation"]) if row.get("wind_generation") else 0.0
-            price = safe_float(row["price"])
+                valid[i] = False
+    for i in np.flatnonzero(~valid).tolist():
+        errors.append((lines[i], "timestamp", values[i]))
+    return column
+
+def read_columns(filename):
+    # Column-oriented parse of a simulator input: {"timestamp": datetime64[s], "price",
+    # "solar_generation", "wind_generation" and, if present, "consumption": float64}.
+    # Every column is converted in bulk; raises ValueError listing bad rows by line number
+    # instead of substituting 0.0.
+    import numpy as np
 
-            data.append({
-                "timestamp": timestamp,
-                "date": timestamp.date(),
-                "solar_generation": solar,
-                "wind_generation": wind,
-                "price": price,
-            })
-        return data
+    with open(filename, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        records = list(reader)
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"{filename}: missing columns {', '.join(missing)}")
+
+    # Line 1 is the header; blank lines are skipped, rows of the wrong width are errors
+    errors = []
+    lines = range(2, len(records) + 2)
+    if set(map(len, records)) - {len(header)}:
+        keep = [i for i, record in enumerate(records) if len(record) == len(header)]
+        errors.extend((i + 2, None, ",".join(records[i])) for i, record in enumerate(records)
+                      if record and len(record) != len(header))
+        records = [records[i] for i in keep]
+        lines = [i + 2 for i in keep]
+    cells = dict(zip(header, zip(*records))) if records else {name: () for name in header}
+
+    columns = {"timestamp": _timestamp_column(cells["timestamp"], lines, errors)}
+    for name in ("price", "solar_generation", "wind_generation", "consumption"):
+        if name in cells:
+            columns[name] = _float_column(cells[name], name, lines, errors)
+    if "wind_generation" not in columns:
+        columns["wind_generation"] = np.zeros(len(records))
+
+    if errors:
+        raise _bad_values(filename, errors)
+    return columns
+
+def _bad_values(filename, errors):
+    # The ValueError listing (line, column, value) errors by line number
+    errors.sort(key=lambda error: error[0])
+    details = "\n".join(
+        f"  line {line}: " + (f"bad {name} {value!r}" if name else f"wrong number of fields: {value!r}")
+        for line, name, value in errors[:MAX_REPORTED_ERRORS]
+    )
+    more = f"\n  ... and {len(errors) - MAX_REPORTED_ERRORS} more" if len(errors) > MAX_REPORTED_ERRORS else ""
+    return ValueError(f"{filename}: {len(errors)} bad values\n{details}{more}")
+
+def rows_from_columns(columns):
+    # The row dicts the simulators work on (same keys as _parse_row), built column-wise
+    timestamps = columns["timestamp"]
+    names = ["solar_generation", "wind_generation", "price"] + (["consumption"] if "consumption" in columns else [])
+    keys = ["timestamp", "date"] + names
+    values = zip(
+        timestamps.astype(object).tolist(),
+        timestamps.astype("datetime64[D]").astype(object).tolist(),
+        *[columns[name].tolist() for name in names]
+    )
+    return [dict(zip(keys, row)) for row in values]
+
+def read_load(filename):
+    # {timestamp: kWh} from a load CSV, using the first known time and value columns
+    with open(filename, newline='') as f:
+        reader = csv.DictReader(f)
+        time_column, value_column = pick_load_columns(filename, reader.fieldnames or [])
+        return {_parse_timestamp(row[time_column]): safe_float(row[value_column]) for row in reader}
+
+def attach_load(rows, load):
+    # Join a read_load() index onto rows by timestamp; hours it does not cover have no load
+    for row in rows:
+        row["consumption"] = load.get(row["timestamp"], 0.0)
+        yield row
+
+def infer_step_hours(timestamps):
+    # Row length from the median gap between timestamps, in hours. Whole hours stay ints
+    # so hourly runs compute exactly as before; a single row counts as one hour.
+    gaps = [(b - a).total_seconds() for a, b in zip(timestamps, timestamps[1:]) if b > a]
+    if not gaps:
+        return 1
+    hours = statistics.median(gaps) / 3600
+    return int(hours) if hours.is_integer() else hours
+
+# Rows looked at when inferring the step
+STEP_SAMPLE_ROWS = 200
+
+def resolve_step(config, rows):
+    # config with step_hours filled in from the first rows when it was left unset
+    if config.step_hours is not None:
+        return config
+    timestamps = [row["timestamp"] for row in islice(rows, STEP_SAMPLE_ROWS)]
+    return config._replace(step_hours=infer_step_hours(timestamps))
+
+def iter_days(rows):
+    # Group consecutive rows of the same date; input is expected in time order
+    for _, day_rows in groupby(rows, key=lambda r: r["date"]):
+        yield list(day_rows)
+
+def _write_rows(f, data):
+    fieldnames = list(data[0].keys())
+    writer = csv.DictWriter(f, fieldnames)
+    writer.writeheader()
+    writer.writerows(data)
 
 def write_csv(filename, data):
-    fieldnames = list(data[0].keys())
     with open(filename, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
+        _write_rows(f, data)
+
+class CsvResultWriter:
+    # resume_at: size in bytes of an existing output to keep (see tell()); the file is
+    # truncated there and rows are appended under its header
+    def __init__(self, filename, resume_at=None):
+        self.header = None
+        if resume_at is not None:
+            os.truncate(filename, resume_at)
+            with open(filename, newline="") as f:
+                self.header = next(csv.reader(f), None)
+        self.file = open(filename, "w" if self.header is None else "a", newline="")
+        self.writer = None
+
+    def write_rows(self, rows):
+        if self.writer is None:
+            fieldnames = list(rows[0].keys())
+            self.writer = csv.DictWriter(self.file, fieldnames)
+            if self.header is None:
+                self.writer.writeheader()
+            elif self.header != fieldnames:
+                raise ValueError(f"Cannot append: output columns {self.header} differ from {fieldnames}")
+        self.writer.writerows(rows)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+class NpyResultWriter:
+    # Columnar output matching simulation/result_store.py: one structured .npy array with a
+    # datetime64[s] "timestamp" field and a float64 field per numeric column, so readers can
+    # np.load(..., mmap_mode="r") it. Each write_rows() call becomes a compact structured
+    # chunk; close() saves them with np.save, which needs the row count up front.
+    def __init__(self, filename):
+        self.filename = filename
+        self.dtype = None
+        self.chunks = []
+
+    def write_rows(self, rows):
+        import numpy as np
+
+        if not rows:
+            return
+        if self.dtype is None:
+            fields = [
+                name for name, value in rows[0].items()
+                if name != "timestamp" and isinstance(value, (int, float))
+            ]
+            self.dtype = np.dtype([("timestamp", "<M8[s]")] + [(name, "<f8") for name in fields])
+        chunk = np.empty(len(rows), dtype=self.dtype)
+        chunk["timestamp"] = [row["timestamp"] for row in rows]
+        for name in self.dtype.names[1:]:
+            chunk[name] = [row[name] for row in rows]
+        self.chunks.append(chunk)
+
+    def close(self):
+        import numpy as np
+
+        # np.save appends .npy to names without it, so write through a file object
+        with open(self.filename, "wb") as f:
+            if self.chunks:
+                np.save(f, np.concatenate(self.chunks))
+            else:
+                np.save(f, np.empty(0, dtype=[("timestamp", "<M8[s]")]))
+        self.chunks = []
+
+def open_result_writer(filename):
+    # The extension picks the format: .npy is columnar, anything else CSV
+    if filename.endswith(".npy"):
+        return NpyResultWriter(filename)
+    return CsvResultWriter(filename)
+
+def write_result(filename, data):
+    with instrumentation.stage("write", len(data)):
+        writer = open_result_writer(filename)
+        try:
+            writer.write_rows(data)
+        finally:
+            writer.close()
+
+def format_csv(data):
+    # Same output as write_csv, kept in memory
+    f = io.StringIO(newline="")
+    _write_rows(f, data)
+    return f.getvalue()
+
+def iter_date_range(rows, start, end):
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    return (row for row in rows if start_date <= row["date"] <= end_date)
+
+def filter_by_date(data, start, end):
+    return list(iter_date_range(data, start, end))
+
+def summarize(data, config):
+    # One summary row for a simulated run
+    import_cost = sum(row["grid_import_price"] for row in data)
+    export_revenue = sum(row["grid_export_revenue"] for row in data)
+    usable_capacity = config.usable_capacity
+    discharged = sum(row["battery_discharge"] for row in data)
+    cycles = discharged / usable_capacity if usable_capacity > 0 else 0.0
+    return {
+        "import_cost": import_cost,
+        "export_revenue": export_revenue,
+        "cycles": cycles,
+        "net_profit": export_revenue - import_cost,
+    }
+
+def _local_use(row):
+    # Generation consumed on site in the same row
+    generation = row["solar_generation"] + row["wind_generation"]
+    if generation <= 0 or row["consumption"] <= 0:
+        return 0.0
+    return min(generation, row["consumption"])
+
+def simulate_day(rows, soc, config):
+    # Plan and simulate one day, adding the result keys to its rows in place.
+    # Returns the SoC carried into the next day, the only state shared between days.
+    # Inverter limits are per row (config.step_power); the daily throughput and the
+    # charge hours are per calendar day whatever the resolution.
+    started = instrumentation.timer()
+    config = resolve_step(config, rows)
+    inverter_power = config.step_power
+    battery_capacity_kWh = config.battery_capacity_kWh
+    charge_efficiency = config.charge_efficiency
+    discharge_efficiency = config.discharge_efficiency
+    min_soc = config.min_soc
+    max_soc = config.max_soc
+    charge_hours_per_day = config.hours_to_steps(config.charge_hours_per_day)
+    max_daily_throughput = battery_capacity_kWh * config.max_cycles_per_day
+
+    # With load, generation first covers the site's own consumption and only the
+    # residual takes part in charging and export
+    has_load = bool(rows) and "consumption" in rows[0]
+    if has_load:
+        local_use = {r["timestamp"]: _local_use(r) for r in rows}
+        generation = {r["timestamp"]: r["solar_generation"] + r["wind_generation"] - local_use[r["timestamp"]] for r in rows}
+    else:
+        generation = {r["timestamp"]: r["solar_generation"] + r["wind_generation"] for r in rows}
+
+    # Pre-sum generation and calculate grid need
+    total_daily_gen = sum(generation[r["timestamp"]] for r in rows)
+    total_from_renewables = total_daily_gen * charge_efficiency
+    daily_needed_energy = (max_soc - min_soc) * battery_capacity_kWh
+    grid_energy_needed = max(daily_needed_energy - total_from_renewables, 0)
+
+    # Get cheapest hours and assign planned grid charge
+    sorted_cheap = sorted(rows, key=lambda r: r["price"])[:charge_hours_per_day]
+    grid_charge_plan = {}
+    energy_remaining = grid_energy_needed
+    for r in sorted_cheap:
+        charge = min(inverter_power, energy_remaining)
+        grid_charge_plan[r["timestamp"]] = charge
+        energy_remaining -= charge
+        if energy_remaining <= 0:
+            break
+
+    # Get discharge hours
+    #expensive_hours = set(r["timestamp"] for r in sorted(rows, key=lambda r: r["price"], reverse=True)[:discharge_hours_per_day])
+
+
+    # Battery discharge need (kWh)
+    total_discharge_needed = (max_soc - min_soc) * battery_capacity_kWh
+
+    # Filter rows where inverter is not already full from solar/wind
+    available_for_discharge = [
+        r for r in rows
+        if generation[r["timestamp"]] < inverter_power * 0.9  # leave some headroom
+    ]
+
+    # Sort these rows by price, descending
+    available_for_discharge.sort(key=lambda r: r["price"], reverse=True)
+
+    # Select enough hours to discharge the needed energy (limited by inverter power per hour)
+    selected_hours = []
+    remaining_discharge = total_discharge_needed
+
+    for r in available_for_discharge:
+        if remaining_discharge <= 0:
+            break
+        discharge_this_hour = min(inverter_power, remaining_discharge)
+        remaining_discharge -= discharge_this_hour
+        selected_hours.append(r["timestamp"])
+
+    expensive_hours = set(selected_hours)
+    started = instrumentation.record("plan", started, len(rows))
+
+
+    energy_moved_today = 0
+    cycles_today = 0
+    for row in rows:
+        timestamp = row["timestamp"]
+        total_gen = generation[timestamp]
+        grid_export = 0
+
+        row.update({
+            "soc": soc,
+            "battery_charge": 0.0,
+            "battery_charge_renewable": 0.0,
+            "battery_discharge": 0.0,
+            "grid_import": 0.0,
+            "grid_import_price": 0.0,
+            "grid_export": 0.0,
+            "grid_export_revenue": 0.0,
+            "temp": 0.0,
+        })
+        if has_load:
+            consumption = row["consumption"] - local_use[timestamp]
+            row["local_use"] = local_use[timestamp]
+            row["battery_to_load"] = 0.0
+
+        # Charge from renewables
+        charge_limit = battery_capacity_kWh * max_soc
+        if total_gen > 0 and soc < charge_limit and energy_moved_today < max_daily_throughput:
+            max_charge_possible = min(charge_limit - soc, total_gen * charge_efficiency)
+            remaining_throughput = max_daily_throughput - energy_moved_today
+            actual_charge = min(max_charge_possible, remaining_throughput)
+            battery_charge = actual_charge
+            soc += battery_charge
+            total_gen -= battery_charge / charge_efficiency
+            energy_moved_today += actual_charge
+            row["battery_charge"] += battery_charge
+            row["battery_charge_renewable"] += battery_charge
+
+        # Export excess renewable generation
+        if total_gen > 0:
+            grid_export = min(total_gen, inverter_power)
+            row["grid_export"] += grid_export
+            row["grid_export_revenue"] += grid_export * (row["price"] / 1000)
+
+        # The battery covers the site's remaining load through the inverter, which it
+        # shares with the export above and the export discharge below
+        discharge_limit = battery_capacity_kWh * min_soc
+        inverter_headroom = inverter_power - grid_export
+        if has_load and consumption > 0 and soc > discharge_limit and energy_moved_today < max_daily_throughput:
+            actual_discharge = min(soc - discharge_limit, consumption / discharge_efficiency,
+                                   max_daily_throughput - energy_moved_today, inverter_headroom)
+            if actual_discharge > 0:
+                delivered = actual_discharge * discharge_efficiency
+                soc -= actual_discharge
+                energy_moved_today += actual_discharge
+                inverter_headroom -= actual_discharge
+                consumption -= delivered
+                row["battery_discharge"] += actual_discharge
+                row["battery_to_load"] = delivered
+
+        # Grid charging if in planned hours
+        if timestamp in grid_charge_plan and soc < charge_limit and energy_moved_today < max_daily_throughput:
+            planned = grid_charge_plan[timestamp]
+            actual_charge = min(planned, charge_limit - soc, max_daily_throughput - energy_moved_today)
+            grid_energy = actual_charge / charge_efficiency
+            soc += actual_charge
+            energy_moved_today += actual_charge
+            row["battery_charge"] += actual_charge
+            row["grid_import"] = grid_energy
+            row["grid_import_price"] = grid_energy * (row["price"] / 1000)
+
+        # Discharge if in expensive hours
+        if timestamp in expensive_hours and soc > discharge_limit and energy_moved_today < max_daily_throughput:
+            available_discharge = soc - discharge_limit
+            actual_discharge = min(inverter_headroom, available_discharge, inverter_power, max_daily_throughput - energy_moved_today)
+            grid_export = actual_discharge * discharge_efficiency
+            soc -= actual_discharge
+            energy_moved_today += actual_discharge
+            if row["battery_discharge"]:
+                row["battery_discharge"] += actual_discharge  # on top of the load discharge
+            else:
+                row["battery_discharge"] = actual_discharge
+            row["grid_export"] += grid_export
+            row["grid_export_revenue"] += grid_export * (row["price"] / 1000)
+
+        # Whatever load is left comes from the grid
+        if has_load and consumption > 0:
+            row["grid_import"] += consumption
+            row["grid_import_price"] += consumption * (row["price"] / 1000)
+
+        row["soc"] = soc
+
+    instrumentation.record("dispatch", started, len(rows))
+    return soc
 
-def simulate_energy_flow(data):
-    soc = battery_capacity_kWh * min_soc
-    usable_capacity = (max_soc - min_soc) * battery_capacity_kWh
-    max_daily_throughput = battery_capacity_kWh * 3
+def simulate_energy_flow(data, config):
+    # Returns new row dicts; the input rows are left untouched so they can be reused
+    config = resolve_step(config, data)
+    soc = config.battery_capacity_kWh * config.min_soc
 
     # Group rows by day
+    result = [dict(row) for row in data]
     by_day = defaultdict(list)
-    for row in data:
+    for row in result:
         by_day[row["date"]].append(row)
 
-    for day, rows in by_day.items():
-        # Pre-sum generation and calculate grid need
-        total_daily_gen = sum(r["solar_generation"] + r["wind_generation"] for r in rows)
-        total_from_renewables = total_daily_gen * charge_efficiency
-        daily_needed_energy = (max_soc - min_soc) * battery_capacity_kWh
-        grid_energy_needed = max(daily_needed_energy - total_from_renewables, 0)
-
-        # Get cheapest hours and assign planned grid charge
-        sorted_cheap = sorted(rows, key=lambda r: r["price"])[:charge_hours_per_day]
-        grid_charge_plan = {}
-        energy_remaining = grid_energy_needed
-        for r in sorted_cheap:
-            charge = min(inverter_power, energy_remaining)
-            grid_charge_plan[r["timestamp"]] = charge
-            energy_remaining -= charge
-            if energy_remaining <= 0:
-                break
-
-        # Get discharge hours
-        #expensive_hours = set(r["timestamp"] for r in sorted(rows, key=lambda r: r["price"], reverse=True)[:discharge_hours_per_day])
-
-
-        # Battery discharge need (kWh)
-        total_discharge_needed = (max_soc - min_soc) * battery_capacity_kWh
-
-        # Filter rows where inverter is not already full from solar/wind
-        available_for_discharge = [
-            r for r in rows
-            if (r["solar_generation"] + r["wind_generation"]) < inverter_power * 0.9  # leave some headroom
-        ]
-
-        # Sort these rows by price, descending
-        available_for_discharge.sort(key=lambda r: r["price"], reverse=True)
-
-        # Select enough hours to discharge the needed energy (limited by inverter power per hour)
-        selected_hours = []
-        remaining_discharge = total_discharge_needed
-
-        for r in available_for_discharge:
-            if remaining_discharge <= 0:
-                break
-            discharge_this_hour = min(inverter_power, remaining_discharge)
-            remaining_discharge -= discharge_this_hour
-            selected_hours.append(r["timestamp"])
-
-        expensive_hours = set(selected_hours)
-
-
-        energy_moved_today = 0
-        cycles_today = 0
-        for row in rows:
-            timestamp = row["timestamp"]
-            solar_gen = row["solar_generation"]
-            wind_gen = row["wind_generation"]
-            total_gen = solar_gen + wind_gen
-            grid_export = 0
-
-            row.update({
-                "soc": soc,
-                "battery_charge": 0.0,
-                "battery_charge_renewable": 0.0,
-                "battery_discharge": 0.0,
-                "grid_import": 0.0,
-                "grid_import_price": 0.0,
-                "grid_export": 0.0,
-                "grid_export_revenue": 0.0,
-                "temp": 0.0,
-            })
-
-            # Charge from renewables
-            charge_limit = battery_capacity_kWh * max_soc
-            if total_gen > 0 and soc < charge_limit and energy_moved_today < max_daily_throughput:
-                max_charge_possible = min(charge_limit - soc, total_gen * charge_efficiency)
-                remaining_throughput = max_daily_throughput - energy_moved_today
-                actual_charge = min(max_charge_possible, remaining_throughput)
-                battery_charge = actual_charge
-                soc += battery_charge
-                total_gen -= battery_charge / charge_efficiency
-                energy_moved_today += actual_charge
-                row["battery_charge"] += battery_charge
-                row["battery_charge_renewable"] += battery_charge
-
-            # Export excess renewable generation
-            if total_gen > 0:
-                grid_export = min(total_gen, inverter_power)
-                row["grid_export"] += grid_export
-                row["grid_export_revenue"] += grid_export * (row["price"] / 1000)
-
-            # Grid charging if in planned hours
-            if timestamp in grid_charge_plan and soc < charge_limit and energy_moved_today < max_daily_throughput:
-                planned = grid_charge_plan[timestamp]
-                actual_charge = min(planned, charge_limit - soc, max_daily_throughput - energy_moved_today)
-                grid_energy = actual_charge / charge_efficiency
-                soc += actual_charge
-                energy_moved_today += actual_charge
-                row["battery_charge"] += actual_charge
-                row["grid_import"] = grid_energy
-                row["grid_import_price"] = grid_energy * (row["price"] / 1000)
-
-            # Discharge if in expensive hours
-            discharge_limit = battery_capacity_kWh * min_soc
-            if timestamp in expensive_hours and soc > discharge_limit and energy_moved_today < max_daily_throughput:
-                available_discharge = soc - discharge_limit
-                actual_discharge = min(inverter_power - grid_export, available_discharge, inverter_power, max_daily_throughput - energy_moved_today)
-                grid_export = actual_discharge * discharge_efficiency
-                soc -= actual_discharge
-                energy_moved_today += actual_discharge
-                row["battery_discharge"] = actual_discharge
-                row["grid_export"] += grid_export
-                row["grid_export_revenue"] += grid_export * (row["price"] / 1000)
-
-            row["soc"] = soc
-
-    return data
+    for rows in by_day.values():
+        soc = simulate_day(rows, soc, config)
+
+    return result
+
+def _dispatch_inputs(rows, config):
+    # Arrays and per-hour limits for dispatch_optimizer; needs numpy, so it is imported here.
+    # With load, generation is what is left after the site's own consumption. free is
+    # the generation the inverter cannot export, which the battery stores at no cost.
+    import numpy as np
+
+    price = np.array([row["price"] for row in rows], dtype=np.float64)
+    generation = np.array([row["solar_generation"] + row["wind_generation"] for row in rows], dtype=np.float64)
+    if rows and "consumption" in rows[0]:
+        generation -= np.array([_local_use(row) for row in rows], dtype=np.float64)
+    day_id = np.array([row["date"].toordinal() for row in rows], dtype=np.int64)
+    inverter_power = config.step_power
+    max_charge = inverter_power * config.charge_efficiency
+    max_discharge = np.maximum(inverter_power - np.minimum(generation, inverter_power), 0.0)
+    free = np.maximum(generation - inverter_power, 0.0)
+    return price, generation, day_id, max_charge, max_discharge, free
+
+def _apply_dispatch(rows, energy_change, soc, generation, price, config):
+    # Settle the battery schedule into the same output fields as simulate_day. With
+    # load, discharge serves the remaining load before it is exported, and whatever load
+    # is left is imported.
+    from dispatch_optimizer import settle_flows
+
+    has_load = bool(rows) and "consumption" in rows[0]
+    local_use = [_local_use(row) for row in rows] if has_load else None
+    load = [row["consumption"] - used for row, used in zip(rows, local_use)] if has_load else None
+    flows = settle_flows(
+        energy_change, generation, price, config.charge_efficiency, config.discharge_efficiency, config.step_power,
+        load
+    )
+    columns = {"soc": soc}
+    columns.update(flows)
+    columns = {name: values.tolist() for name, values in columns.items()}
+    for i, row in enumerate(rows):
+        row.update({
+            "soc": columns["soc"][i],
+            "battery_charge": columns["battery_charge"][i],
+            "battery_charge_renewable": columns["battery_charge_renewable"][i],
+            "battery_discharge": columns["battery_discharge"][i],
+            "grid_import": columns["grid_import"][i],
+            "grid_import_price": columns["grid_import_price"][i],
+            "grid_export": columns["grid_export"][i],
+            "grid_export_revenue": columns["grid_export_revenue"][i],
+            "temp": 0.0,
+        })
+        if has_load:
+            row["local_use"] = local_use[i]
+            row["battery_to_load"] = columns["battery_to_load"][i]
+
+def simulate_optimal(data, config, horizon=None):
+    # Profit-maximizing schedule from dispatch_optimizer under the same SoC, inverter,
+    # efficiency and daily throughput limits: over the whole input at once, or with a
+    # rolling window of `horizon` hours
+    from dispatch_optimizer import optimize_dispatch, rolling_dispatch
+
+    config = resolve_step(config, data)
+    started = instrumentation.timer()
+    result = [dict(row) for row in data]
+    price, generation, day_id, max_charge, max_discharge, free = _dispatch_inputs(result, config)
+    args = (
+        price,
+        day_id,
+        config.battery_capacity_kWh,
+        config.min_soc,
+        config.max_soc,
+        max_charge,
+        max_discharge,
+        config.charge_efficiency,
+        config.discharge_efficiency,
+        config.battery_capacity_kWh * config.max_cycles_per_day,
+        free,
+    )
+    if horizon is None:
+        energy_change, soc = optimize_dispatch(*args)
+    else:
+        energy_change, soc = rolling_dispatch(*args, horizon=config.hours_to_steps(horizon))
+    started = instrumentation.record("optimize", started, len(result))
+    _apply_dispatch(result, energy_change, soc, generation, price, config)
+    instrumentation.record("settle", started, len(result))
+    return result
+
+def stream_simulation(
+    input_file, output_file, config, start=None, end=None, strategy="heuristic", horizon=48, load=None,
+    checkpoints=None, append=False, consumption=False
+):
+    # Read, simulate and write one day at a time so memory stays flat for any input length.
+    # load: optional read_load() index joined onto the rows by timestamp; consumption=True
+    # models the input's own consumption column instead.
+    # checkpoints: CheckpointLog file recording the state after every day (heuristic
+    # strategy, CSV output); with append=True the run resumes after its last complete
+    # day instead, so only rows of later days are simulated. Returns the number of
+    # days simulated.
+    rows = iter_csv(input_file, consumption)
+    if start and end:
+        rows = iter_date_range(rows, start, end)
+
+    resume = None
+    if append:
+        first = next(rows, None)
+        rows = chain([first] if first else [], rows)
+        resume = CheckpointLog.resume(checkpoints, config, first["timestamp"] if first else None)
+        if resume is not None:
+            config = resume.config
+    if resume is not None:
+        rows = (row for row in rows if row["date"] > resume.date)
+    if load is not None:
+        rows = attach_load(rows, load)
+    head = list(islice(rows, STEP_SAMPLE_ROWS))
+    config = resolve_step(config, head)
+    days = iter_days(chain(head, rows))
+    if strategy == "rolling":
+        days = _rolling_days(days, config, horizon)
+
+    if resume is not None:
+        soc = resume.soc
+        writer = CsvResultWriter(output_file, resume.output_bytes)
+        log = resume
+    else:
+        soc = config.battery_capacity_kWh * config.min_soc
+        writer = open_result_writer(output_file)
+        log = CheckpointLog.create(checkpoints, config) if checkpoints else None
+    count = 0
+    try:
+        # A day is read and parsed when it is pulled, so read_day covers that; with the
+        # rolling strategy it also includes the optimize and settle stages
+        started = instrumentation.timer()
+        for day_rows in days:
+            started = instrumentation.record("read_day", started, len(day_rows))
+            if strategy != "rolling":
+                soc = simulate_day(day_rows, soc, config)
+                started = instrumentation.timer()
+            writer.write_rows(day_rows)
+            if log is not None:
+                log.add_day(day_rows, soc, writer.tell())
+            started = instrumentation.record("write", started, len(day_rows))
+            count += 1
+    finally:
+        writer.close()
+        if log is not None:
+            log.close()
+    return count
+
+# Cumulative sums kept in every checkpoint
+CHECKPOINT_METRICS = (
+    "grid_import", "grid_import_price", "grid_export", "grid_export_revenue", "battery_charge", "battery_discharge",
+)
+
+class CheckpointLog:
+    # JSON lines written next to a streamed CSV output: a header with the resolved
+    # BatteryConfig, then one line per simulated day with the SoC carried into the
+    # next day, cumulative metrics and the size of the output after that day. The SoC
+    # is the only state the heuristic carries across midnight, so a run can be resumed
+    # at any day boundary: the output is truncated to that size and appended to.
+    # A day is complete when its last row reaches midnight, whatever its row count
+    # (23 or 25 hours on DST changes).
+    def __init__(self, filename, config, last=None, mode="a"):
+        self.config = config
+        self.last = last or {"date": None, "start": None, "rows": 0, "complete": False, "soc": None,
+                             "output_bytes": None, "totals": dict.fromkeys(CHECKPOINT_METRICS, 0.0)}
+        self.file = open(filename, mode)
+
+    @classmethod
+    def create(cls, filename, config):
+        log = cls(filename, config, mode="w")
+        log._write({"config": config._asdict()})
+        return log
+
+    @classmethod
+    def resume(cls, filename, config, first_timestamp):
+        # Log positioned after the last complete day, or None when there is nothing to
+        # resume (no log, or not even one complete day yet). Incomplete days at the end
+        # are dropped so they are simulated again with the rows that complete them, which
+        # the new input (starting at first_timestamp) must then hold from their first row.
+        if not os.path.exists(filename):
+            return None
+        with open(filename) as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines:
+            return None
+        saved = BatteryConfig(**lines[0]["config"])
+        if config.step_hours is None:
+            config = config._replace(step_hours=saved.step_hours)
+        if config != saved:
+            raise ValueError(f"Cannot append: checkpoints were written with {saved}, not {config}")
+        days = lines[1:]
+        for day in days:
+            # Logs from before "complete" and "start" were recorded
+            day.setdefault("complete", day["rows"] >= config.hours_to_steps(24))
+            day.setdefault("start", day["date"] + " 00:00:00")
+        while days and not days[-1]["complete"]:
+            days.pop()
+        if len(days) < len(lines) - 1:
+            partial = lines[len(days) + 1]
+            if first_timestamp is None or first_timestamp > _parse_timestamp(partial["start"]):
+                raise ValueError(
+                    f"Cannot append: the output ends part way through {partial['date']}, so the input must "
+                    f"include that day from {partial['start']} (it starts at {first_timestamp or 'no rows'})"
+                )
+        if not days:
+            return None
+        for day in days:
+            day["date"] = datetime.strptime(day["date"], "%Y-%m-%d").date()
+        if len(days) < len(lines) - 1:
+            log = cls.create(filename, config)
+            for day in days:
+                log._write(day)
+            log.last = days[-1]
+        else:
+            log = cls(filename, config, days[-1])
+        return log
+
+    @property
+    def date(self):
+        return self.last["date"]
+
+    @property
+    def soc(self):
+        return self.last["soc"]
+
+    @property
+    def output_bytes(self):
+        return self.last["output_bytes"]
+
+    def add_day(self, rows, soc, output_bytes):
+        totals = dict(self.last["totals"])
+        for name in CHECKPOINT_METRICS:
+            totals[name] += sum(row[name] for row in rows)
+        end = rows[-1]["timestamp"] + timedelta(hours=self.config.step_hours)
+        self.last = {"date": rows[0]["date"], "start": rows[0]["timestamp"], "rows": len(rows),
+                     "complete": end.date() > rows[0]["date"], "soc": soc,
+                     "output_bytes": output_bytes, "totals": totals}
+        self._write(self.last)
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, default=str) + "\n")
+
+    def close(self):
+        self.file.close()
+
+def _rolling_days(days, config, horizon):
+    # Dispatch days with a RollingPlanner: a day is executed once at least `horizon`
+    # hours from its start are known, so only that window is held in memory.
+    # config.step_hours must be set.
+    from collections import deque
+    from dispatch_optimizer import RollingPlanner
+
+    planner = RollingPlanner(
+        config.battery_capacity_kWh,
+        config.min_soc,
+        config.max_soc,
+        config.charge_efficiency,
+        config.discharge_efficiency,
+        config.battery_capacity_kWh * config.max_cycles_per_day,
+    )
+    pending = deque()
+
+    def execute():
+        day_rows, price, generation = pending.popleft()
+        started = instrumentation.timer()
+        energy_change, soc = planner.advance(len(day_rows))
+        started = instrumentation.record("optimize", started, len(day_rows))
+        _apply_dispatch(day_rows, energy_change, soc, generation, price, config)
+        instrumentation.record("settle", started, len(day_rows))
+        return day_rows
+
+    for day_rows in days:
+        day_rows = list(day_rows)
+        price, generation, day_id, max_charge, max_discharge, free = _dispatch_inputs(day_rows, config)
+        planner.extend(price, day_id, max_charge, max_discharge, free)
+        pending.append((day_rows, price, generation))
+        while pending and len(planner) >= config.hours_to_steps(horizon):
+            yield execute()
+    while pending:
+        yield execute()
+
+STRATEGIES = ("heuristic", "optimal", "rolling")
+
+def simulate(data, config, strategy="heuristic", horizon=48):
+    if strategy == "optimal":
+        return simulate_optimal(data, config)
+    if strategy == "rolling":
+        return simulate_optimal(data, config, horizon)
+    return simulate_energy_flow(data, config)
+
+def run_simulation(
+    input_file, config, start=None, end=None, strategy="heuristic", horizon=48, load=None, cache=None,
+    consumption=False
+):
+    # In-process entry point: parse, filter and simulate without touching module state
+    data = parse_csv(input_file, cache, consumption)
+    started = instrumentation.timer()
+    if start and end:
+        data = filter_by_date(data, start, end)
+    if load is not None:
+        data = list(attach_load(data, load))
+    instrumentation.record("filter", started, len(data))
+    return simulate(data, config, strategy, horizon)
 
 if __name__ == '__main__':
     import sys
@@ -183,31 +905,92 @@ if __name__ == '__main__':
     parser.add_argument('--battery', type=int, default=400, help='Battery capacity in kWh')
     parser.add_argument('--efficiency', type=float, default=0.94, help='Battery round-trip efficiency (0-1)')
     parser.add_argument('--reserve', type=float, default=0.95, help='Battery reserve percentage (0-1)')
+    parser.add_argument('--output', default='simulation_output.csv', help='Output file; .npy writes the columnar format')
+    parser.add_argument('--stream', action='store_true', help='Simulate day by day with constant memory')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='heuristic',
+                        help='Dispatch: cheapest/most expensive hours per day, the profit-maximizing schedule '
+                             'over the whole input, or the same with a rolling --horizon window')
+    parser.add_argument('--horizon', type=int, default=48, help='Rolling strategy lookahead in hours (e.g. 24-48)')
+    parser.add_argument('--load', help='Site consumption CSV joined by timestamp (instead of a consumption column)')
+    parser.add_argument('--consumption', action='store_true',
+                        help="Model the site load from the input's consumption column (ignored otherwise)")
+    parser.add_argument('--step-minutes', type=float,
+                        help='Minutes per input row, e.g. 15 (default: inferred from the timestamps)')
+    parser.add_argument('--cache-dir',
+                        help='Reuse parsed inputs and CSV results from this content-addressed cache directory')
+    parser.add_argument('--checkpoints', metavar='JSONL',
+                        help='Record the SoC and cumulative metrics after every day (heuristic strategy, CSV output)')
+    parser.add_argument('--append', action='store_true',
+                        help='Resume after the last complete day in --checkpoints and append only later days to '
+                             '--output')
+    parser.add_argument('--summary', metavar='JSON',
+                        help='Also write the aggregated, downsampled plot payload (see plot_summary.py)')
+    parser.add_argument('--points', type=int, default=1000, help='Points per plotted series in --summary')
+    parser.add_argument('--window-start', help='Zoom window start for --summary (date or datetime)')
+    parser.add_argument('--window-end', help='Zoom window end for --summary (date or datetime)')
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+    if args.summary:
+        import plot_summary  # needs numpy, like the optimizer
+
+    if args.stream and args.strategy == 'optimal':
+        parser.error('--stream needs the heuristic or rolling strategy')
+    if args.summary and (args.stream or args.output.endswith('.npy')):
+        parser.error('--summary needs CSV output without --stream')
+    if args.append and not args.checkpoints:
+        parser.error('--append needs --checkpoints')
+    if args.checkpoints and (args.strategy != 'heuristic' or args.output.endswith('.npy') or args.summary):
+        parser.error('--checkpoints needs the heuristic strategy and CSV output, without --summary')
     
-    # Update global variables based on arguments
-    global inverter_power, battery_capacity_kWh, charge_efficiency, discharge_efficiency, max_soc, min_soc
-    inverter_power = args.inverter
-    battery_capacity_kWh = args.battery
-
-    max_soc = args.reserve
-    min_soc = 1 - args.reserve
-
-    # Calculate charge/discharge efficiency as square root of round-trip efficiency
-    efficiency_per_cycle = args.efficiency ** 0.5
-    charge_efficiency = efficiency_per_cycle
-    discharge_efficiency = efficiency_per_cycle
-    
-    # Read the CSV file
-    all_data = parse_csv(args.input_file)
-
-    # Apply date filtering if dates are provided
-    if args.start and args.end:
-        start_date = datetime.strptime(args.start, "%Y-%m-%d").date()
-        end_date = datetime.strptime(args.end, "%Y-%m-%d").date()
-        all_data = [row for row in all_data if start_date <= row["date"] <= end_date]
-
-    result = simulate_energy_flow(all_data)
-    write_csv("simulation_output.csv", result)
-    print("Simulation complete. Output saved to simulation_output.csv")
+    step_hours = args.step_minutes / 60 if args.step_minutes else None
+    config = BatteryConfig.from_settings(args.inverter, args.battery, args.efficiency, args.reserve, step_hours=step_hours)
+    load = read_load(args.load) if args.load else None
+
+    if args.checkpoints:
+        # Day by day like --stream, so every day boundary can be recorded
+        try:
+            days = stream_simulation(args.input_file, args.output, config, args.start, args.end, args.strategy,
+                                     args.horizon, load, args.checkpoints, args.append, args.consumption)
+        except ValueError as e:
+            print(f"Invalid input: {e}")
+            sys.exit(1)
+        print(f"Simulated {days} days. Output saved to {args.output}, checkpoints to {args.checkpoints}")
+        sys.exit(0)
+
+    cache = key = None
+    if args.cache_dir and not args.stream:
+        import result_cache
+        cache = result_cache.SimulationCache(args.cache_dir)
+        if not args.output.endswith('.npy'):
+            key = result_cache.request_key(
+                result_cache.content_digest(args.input_file), config, args.start, args.end, args.strategy, args.horizon,
+                result_cache.content_digest(args.load) if args.load else None, args.consumption)
+            if cache.get_result_file(key, args.output):
+                if args.summary:
+                    with open(args.output, newline='') as f:
+                        plot_summary.write_summary(args.summary, plot_summary.columns_from_csv(f.read()),
+                                                   args.points, args.window_start, args.window_end)
+                print(f"Simulation complete (cached). Output saved to {args.output}")
+                sys.exit(0)
+
+    try:
+        if args.stream:
+            stream_simulation(args.input_file, args.output, config, args.start, args.end, args.strategy,
+                              args.horizon, load, consumption=args.consumption)
+        else:
+            result = run_simulation(args.input_file, config, args.start, args.end, args.strategy, args.horizon, load,
+                                    cache, args.consumption)
+    except ValueError as e:
+        # Printed to stdout so simulate.php can show which rows were rejected
+        print(f"Invalid input: {e}")
+        sys.exit(1)
+    if not args.stream:
+        write_result(args.output, result)
+        if key is not None:
+            cache.put_result_file(key, args.output)
+        if args.summary:
+            plot_summary.write_summary(args.summary, plot_summary.columns_from_rows(result),
+                                       args.points, args.window_start, args.window_end)
+    print(f"Simulation complete. Output saved to {args.output}")
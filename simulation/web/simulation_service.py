@@ -0,0 +1,186 @@
+import json
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import instrumentation
+import plot_summary
+import result_cache
+import simulation_grid_battery_vanilla as sim
+
+# Long-running simulation service for simulate.php.
+#
+# POST /simulate with a JSON body:
+#   {"input_file": "/abs/path.csv", "inverter": 200, "battery": 400,
+#    "efficiency": 0.94, "reserve": 0.95, "start": "2024-01-01", "end": "2024-01-31",
+#    "strategy": "heuristic", "horizon": 48, "step_minutes": 15, "consumption": false}
+# answers {"success": true, "csv": "<simulation output>"}, with "cached": true when the
+# result came from the result cache. step_minutes is optional; by default the row
+# length is inferred from the input timestamps. The input's consumption column is
+# only modelled with "consumption": true. With "profile": true the response also
+# carries the per-stage timings of the request (see instrumentation.py).
+# "summary": {"points": 1000, "window_start": ..., "window_end": ...} (or true) adds the
+# aggregated, downsampled plot payload of plot_summary.py; "csv": false then leaves out
+# the full output.
+#
+# Simulations run in a pool of worker processes, each keeping recently parsed
+# inputs in memory, keyed by content hash. With a cache directory (the default, see
+# result_cache.py) parsed inputs and output CSVs are also kept on disk and shared by
+# all workers: an identical request is answered from the result cache, and a request
+# that only changes parameters skips parsing.
+
+PARSED_CACHE_SIZE = 8
+
+# Per-worker cache of parsed inputs, keyed by content hash and consumption mode
+_parsed = OrderedDict()
+# Per-worker result_cache.SimulationCache, or None when disk caching is off
+_cache = None
+
+
+def _init_worker(cache_dir):
+    global _cache
+    _cache = result_cache.SimulationCache(cache_dir) if cache_dir else None
+
+
+def _load(input_file, digest, consumption):
+    key = (digest, consumption)
+    if key in _parsed:
+        _parsed.move_to_end(key)
+        return _parsed[key]
+
+    data = sim.parse_csv(input_file, _cache, consumption)
+    _parsed[key] = data
+    if len(_parsed) > PARSED_CACHE_SIZE:
+        _parsed.popitem(last=False)
+    return data
+
+
+def simulate_request(request):
+    if not request.get("profile"):
+        return _simulate(request)
+    # Workers run one request at a time, so the process-wide session is the request's
+    instrumentation.enable(output=None, write_at_exit=False)
+    try:
+        response = _simulate(request)
+    finally:
+        profile = instrumentation.finish()
+    response["profile"] = profile
+    return response
+
+
+def _simulate(request):
+    config = sim.BatteryConfig.from_settings(
+        int(request.get("inverter", 200)),
+        int(request.get("battery", 400)),
+        float(request.get("efficiency", 0.94)),
+        float(request.get("reserve", 0.95)),
+        step_hours=float(request["step_minutes"]) / 60 if request.get("step_minutes") else None,
+    )
+    strategy = request.get("strategy", "heuristic")
+    if strategy not in sim.STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    start, end, horizon = request.get("start"), request.get("end"), int(request.get("horizon", 48))
+    consumption = bool(request.get("consumption"))
+
+    input_file = request["input_file"]
+    digest = result_cache.content_digest(input_file)
+    key = csv = result = None
+    if _cache is not None:
+        key = result_cache.request_key(digest, config, start, end, strategy, horizon, consumption=consumption)
+        with instrumentation.stage("cache"):
+            csv = _cache.get_result(key)
+
+    response = {"success": True}
+    if csv is not None:
+        response["cached"] = True
+    else:
+        data = _load(input_file, digest, consumption)
+        if start and end:
+            data = sim.filter_by_date(data, start, end)
+        if not data:
+            raise ValueError("No rows to simulate")
+
+        result = sim.simulate(data, config, strategy, horizon)
+        with instrumentation.stage("format", len(result)):
+            csv = sim.format_csv(result)
+        if key is not None:
+            _cache.put_result(key, csv)
+
+    if request.get("csv", True):
+        response["csv"] = csv
+    if request.get("summary"):
+        options = request["summary"] if isinstance(request["summary"], dict) else {}
+        columns = plot_summary.columns_from_rows(result) if result is not None else plot_summary.columns_from_csv(csv)
+        response["summary"] = plot_summary.summarize(
+            columns,
+            int(options.get("points", plot_summary.DEFAULT_POINTS)),
+            options.get("window_start"),
+            options.get("window_end"),
+        )
+    return response
+
+
+class SimulationHandler(BaseHTTPRequestHandler):
+    pool = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"success": True})
+        else:
+            self._send_json(404, {"success": False, "error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/simulate":
+            self._send_json(404, {"success": False, "error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            response = self.pool.submit(simulate_request, request).result()
+        except Exception as e:
+            self._send_json(400, {"success": False, "error": f"Simulation failed: {e}"})
+            return
+        self._send_json(200, response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host="127.0.0.1", port=8765, workers=None, cache_dir=result_cache.DEFAULT_CACHE_DIR):
+    if cache_dir:
+        # Create the directories once, before the workers race for them
+        result_cache.SimulationCache(cache_dir)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_dir,)) as pool:
+        SimulationHandler.pool = pool
+        server = ThreadingHTTPServer((host, port), SimulationHandler)
+        print(f"Simulation service listening on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Energy Analytics simulation service')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--workers', type=int, help='Simulation worker processes (default: CPU count)')
+    parser.add_argument('--cache-dir', default=result_cache.DEFAULT_CACHE_DIR,
+                        help='Directory of the parsed-input and result caches (default: web/cache)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not cache parsed inputs and results on disk')
+
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, None if args.no_cache else args.cache_dir)
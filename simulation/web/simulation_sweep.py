@@ -0,0 +1,155 @@
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+import simulation_grid_battery_vanilla as sim
+
+# Parsed input shared by every task of a worker process
+_data = None
+
+
+_strategy = "heuristic"
+_horizon = 48
+
+
+def _init_worker(data, strategy="heuristic", horizon=48):
+    global _data, _strategy, _horizon
+    _data = data
+    _strategy = strategy
+    _horizon = horizon
+
+
+def _run_config(settings, hourly_dir=None):
+    inverter, battery, efficiency, reserve = settings
+    config = sim.BatteryConfig.from_settings(inverter, battery, efficiency, reserve)
+    result = sim.simulate(_data, config, _strategy, _horizon)
+
+    summary = {
+        "inverter": inverter,
+        "battery": battery,
+        "efficiency": efficiency,
+        "reserve": reserve,
+    }
+    summary.update(sim.summarize(result, config))
+
+    if hourly_dir:
+        filename = f"simulation_output_inv{inverter}_bat{battery}_eff{efficiency}_res{reserve}.csv"
+        sim.write_csv(os.path.join(hourly_dir, filename), result)
+    return summary
+
+
+def run_sweep(
+    data,
+    inverters,
+    batteries,
+    efficiencies,
+    reserves,
+    workers=None,
+    hourly_dir=None,
+    strategy="heuristic",
+    horizon=48
+):
+    grid = list(itertools.product(inverters, batteries, efficiencies, reserves))
+    if hourly_dir:
+        os.makedirs(hourly_dir, exist_ok=True)
+
+    chunksize = max(1, len(grid) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data, strategy, horizon)) as pool:
+        return list(pool.map(_run_config, grid, itertools.repeat(hourly_dir), chunksize=chunksize))
+
+
+def run_batched_sweep(data, inverters, batteries, efficiencies, reserves):
+    # Every configuration in one pass of the 2-D batch kernel (heuristic strategy, no
+    # hourly output, no site load); needs the same number of rows on every day
+    import numpy as np
+    from batch_kernel import METRICS, simulate_configs
+
+    if data and "consumption" in data[0]:
+        raise ValueError("Batched sweep does not model site consumption")
+    days = [list(rows) for rows in sim.iter_days(data)]
+    if len({len(rows) for rows in days}) > 1:
+        raise ValueError("Batched sweep needs the same number of rows on every day")
+    price = np.array([[row["price"] for row in rows] for rows in days], dtype=np.float64)
+    generation = np.array(
+        [[row["solar_generation"] + row["wind_generation"] for row in rows] for rows in days], dtype=np.float64
+    )
+
+    grid = list(itertools.product(inverters, batteries, efficiencies, reserves))
+    step_hours = sim.infer_step_hours([row["timestamp"] for row in data[:sim.STEP_SAMPLE_ROWS]])
+    configs = [sim.BatteryConfig.from_settings(*settings, step_hours=step_hours) for settings in grid]
+    matrix = simulate_configs(price, generation, configs)
+    columns = [METRICS.index(name) for name in ("import_cost", "export_revenue", "cycles", "net_profit")]
+
+    summaries = []
+    for (inverter, battery, efficiency, reserve), row in zip(grid, matrix[:, columns].tolist()):
+        summaries.append({
+            "inverter": inverter,
+            "battery": battery,
+            "efficiency": efficiency,
+            "reserve": reserve,
+            "import_cost": row[0],
+            "export_revenue": row[1],
+            "cycles": row[2],
+            "net_profit": row[3],
+        })
+    return summaries
+
+
+def write_summary(filename, summaries):
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, list(summaries[0].keys()))
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Energy Analytics parameter sweep')
+    parser.add_argument('input_file', help='Input CSV file')
+    parser.add_argument('--start', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--inverter', type=int, nargs='+', default=[200], help='Inverter powers in kW')
+    parser.add_argument('--battery', type=int, nargs='+', default=[400], help='Battery capacities in kWh')
+    parser.add_argument('--efficiency', type=float, nargs='+', default=[0.94], help='Battery round-trip efficiencies (0-1)')
+    parser.add_argument('--reserve', type=float, nargs='+', default=[0.95], help='Battery reserve percentages (0-1)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--output', default='sweep_summary.csv', help='Summary CSV, one row per configuration')
+    parser.add_argument('--hourly-dir', help='Also write the full hourly output of every configuration here')
+    parser.add_argument('--strategy', choices=sim.STRATEGIES, default='heuristic', help='Dispatch strategy')
+    parser.add_argument('--horizon', type=int, default=48, help='Rolling strategy lookahead in hours')
+    parser.add_argument('--batched', action='store_true',
+                        help='Advance all configurations together in one NumPy kernel (heuristic strategy only)')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+    if args.batched and (args.strategy != 'heuristic' or args.hourly_dir):
+        parser.error('--batched only supports the heuristic strategy without --hourly-dir')
+
+    # Parse the input once; every configuration reuses it
+    data = sim.parse_csv(args.input_file)
+    if args.start and args.end:
+        data = sim.filter_by_date(data, args.start, args.end)
+
+    # Worker processes are not instrumented; the sweep stage is their wall time
+    started = instrumentation.timer()
+    if args.batched:
+        summaries = run_batched_sweep(data, args.inverter, args.battery, args.efficiency, args.reserve)
+    else:
+        summaries = run_sweep(
+            data,
+            args.inverter,
+            args.battery,
+            args.efficiency,
+            args.reserve,
+            workers=args.workers,
+            hourly_dir=args.hourly_dir,
+            strategy=args.strategy,
+            horizon=args.horizon,
+        )
+    instrumentation.record("sweep", started, len(data) * len(summaries))
+    write_summary(args.output, summaries)
+    print(f"Sweep of {len(summaries)} configurations complete. Summary saved to {args.output}")